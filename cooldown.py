@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+"""Persistent store of notifications sent, to suppress repeated alerts"""
+
+import sqlite3
+import time
+from pathlib import Path
+from typing import Optional
+
+
+class CooldownStore:
+    """SQLite table of (icao, POI, recipient) combinations notified last,
+    with their time. Within `window` seconds, the same combination is not
+    notified again. Older entries are evicted.
+    """
+
+    def __init__(self, filename: Path, window: float):
+        self.window = window
+        self.db = sqlite3.connect(filename)
+        self.db.execute(
+            """CREATE TABLE IF NOT EXISTS cooldown (
+                icao TEXT NOT NULL,
+                poi TEXT NOT NULL,
+                recipient TEXT NOT NULL,
+                time REAL NOT NULL,
+                PRIMARY KEY (icao, poi, recipient)
+            ) WITHOUT ROWID"""
+        )
+        self.db.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        """Close database"""
+        self.db.close()
+
+    def evict(self, now: Optional[float] = None) -> int:
+        """Remove entries older than `window`. Return their number."""
+        now = time.time() if now is None else now
+
+        with self.db:
+            return self.db.execute(
+                "DELETE FROM cooldown WHERE time <= ?", (now - self.window,)
+            ).rowcount
+
+    def check(
+        self, keys: list[tuple[str, str, str]], now: Optional[float] = None
+    ) -> list[bool]:
+        """For each (icao, POI, recipient) in `keys`, determine whether it may
+        be notified, i.e. it was not within `window`, nor before in `keys`.
+        Nothing is recorded, see `record()`."""
+        now = time.time() if now is None else now
+        admitted = []
+        checked = set()
+
+        for key in keys:
+            row = self.db.execute(
+                "SELECT time FROM cooldown WHERE icao = ? AND poi = ? AND recipient = ?",
+                key,
+            ).fetchone()
+
+            admitted.append(
+                key not in checked and not (row and now - row[0] < self.window)
+            )
+            checked.add(key)
+
+        return admitted
+
+    def record(self, keys: list[tuple[str, str, str]], now: Optional[float] = None):
+        """Record `keys` as being notified at `now`"""
+        now = time.time() if now is None else now
+
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO cooldown VALUES (?, ?, ?, ?)",
+                [(*key, now) for key in keys],
+            )
+
+    def admit(
+        self, keys: list[tuple[str, str, str]], now: Optional[float] = None
+    ) -> list[bool]:
+        """`check()` keys, recording those admitted as being notified at `now`"""
+        admitted = self.check(keys, now)
+        self.record([key for key, admit in zip(keys, admitted) if admit], now)
+
+        return admitted
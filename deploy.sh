@@ -5,11 +5,23 @@ readonly SCRIPTDIR=$(dirname "${BASH_SOURCE[0]}")
 ssh flugplan@fra-flugplan.de mkdir -p hems-lookout
 
 rsync -av "$SCRIPTDIR/" flugplan@fra-flugplan.de:hems-lookout \
+	--filter='+ cooldown.py' \
 	--filter='+ gcmath.py' \
+	--filter='+ hemsdb.py' \
+	--filter='+ hemsfilter.py' \
 	--filter='+ install.sh' \
+	--filter='+ metrics.py' \
 	--filter='+ notify.py' \
+	--filter='+ notify.spec' \
+	--filter='+ notify-onedir.spec' \
+	--filter='+ pois.py' \
+	--filter='+ profiling.py' \
 	--filter='+ pyproject.toml' \
 	--filter='+ query-adsb.sh' \
+	--filter='+ segments.py' \
+	--filter='+ topics.py' \
+	--filter='+ tracks.py' \
 	--filter='+ uv.lock' \
+	--filter='+ watcher.py' \
 	--filter='- *' \
 	"$@"
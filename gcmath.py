@@ -6,11 +6,23 @@
 # not having a "speakable" meaning...
 # pylint: disable=invalid-name
 
+import functools
 import math
 from dataclasses import dataclass
+from typing import Callable
+import numpy as np
 
 EARTH_RADIUS = 6371.000785  # [km] as of GRS-80
 
+# Validity and maximum errors of `calc_bearing_distance_flat()` compared to
+# `calc_bearing()`/`calc_distance()`, as measured for positions up to
+# FLAT_MAX_LAT and distances up to FLAT_MAX_DISTANCE, with some margin.
+# At 70 km (notify.MAX_DISTANCE), errors are below 1.2° and 6 m.
+FLAT_MAX_LAT = 75.0  # [°]
+FLAT_MAX_DISTANCE = 100.0  # [km]
+FLAT_BEARING_ERROR = 2.0  # [°], measured 1.67°
+FLAT_DISTANCE_ERROR = 0.025  # [km], measured 0.017 km
+
 
 def isclose(a: float, b: float) -> bool:
     """Extend
@@ -38,6 +50,39 @@ def km_to_rad(d: float) -> float:
     return d / EARTH_RADIUS
 
 
+@functools.lru_cache(maxsize=4096)
+def lon_limit(lat: float, dist: float) -> float:
+    """Upper bound of the longitude difference in degrees between a position
+    at latitude `lat` and any point within `dist` km of it. As both points are
+    no closer to a pole than |`lat`| + `dist`, haversine gives
+    sin(Δlon/2) <= sin(dist/2) / cos(|lat| + dist). Results are cached, as
+    the same position is checked against many points."""
+    d = km_to_rad(dist)
+    phi = math.radians(abs(lat)) + d
+
+    if phi >= math.pi / 2.0:
+        # A pole is within reach, so is any longitude
+        return 180.0
+
+    limit = math.degrees(2.0 * math.asin(min(1.0, math.sin(d / 2.0) / math.cos(phi))))
+
+    # Some slack, so rounding never rejects a point right at the border
+    return limit * (1.0 + 1e-9) + 1e-9
+
+
+def lon_limit_batch(lat, dist: float) -> np.ndarray:
+    """Vectorised `lon_limit()` for an array of latitudes"""
+    d = km_to_rad(dist)
+    phi = np.radians(np.abs(np.asarray(lat, dtype=float))) + d
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        limit = np.degrees(
+            2.0 * np.arcsin(np.minimum(1.0, np.sin(d / 2.0) / np.cos(phi)))
+        )
+
+    return np.where(phi >= np.pi / 2.0, 180.0, limit * (1.0 + 1e-9) + 1e-9)
+
+
 @dataclass
 class LatLon:
     """A simple class holding latitude/longitude"""
@@ -53,6 +98,50 @@ class LatLon:
         return isclose(self.lat, other.lat) and isclose(self.lon, other.lon)
 
 
+def in_bounding_box(src: LatLon, dst: LatLon, dist: float) -> bool:
+    """Cheap conservative check, whether `dst` may be within `dist` km of
+    `src`: False means it is farther for sure, True needs to be confirmed
+    by calculating the distance"""
+    if abs(dst.lat - src.lat) > km_to_deg(dist) * (1.0 + 1e-9) + 1e-9:
+        return False
+
+    delta = abs(dst.lon - src.lon) % 360.0
+
+    return min(delta, 360.0 - delta) <= lon_limit(src.lat, dist)
+
+
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+def in_bounding_box_batch(
+    src_lat, src_lon, dst_lat, dst_lon, dist: float, limit=None
+) -> np.ndarray:
+    """Vectorised `in_bounding_box()`, taking (broadcastable) arrays of
+    latitudes/longitudes in degrees. `limit` may pass `lon_limit_batch()` of
+    `src_lat`, if already known."""
+    src_lat = np.asarray(src_lat, dtype=float)
+
+    if limit is None:
+        limit = lon_limit_batch(src_lat, dist)
+
+    delta = np.abs(np.asarray(dst_lon, dtype=float) - src_lon) % 360.0
+
+    return (
+        np.abs(np.asarray(dst_lat, dtype=float) - src_lat)
+        <= km_to_deg(dist) * (1.0 + 1e-9) + 1e-9
+    ) & (np.minimum(delta, 360.0 - delta) <= limit)
+
+
+def unit_vector(pos: LatLon) -> tuple[float, float, float]:
+    """Convert coordinates to the (x, y, z) ECEF vector on the unit sphere"""
+    lat = math.radians(pos.lat)
+    lon = math.radians(pos.lon)
+
+    return (
+        math.cos(lat) * math.cos(lon),
+        math.cos(lat) * math.sin(lon),
+        math.sin(lat),
+    )
+
+
 def calc_bearing(src: LatLon, dst: LatLon) -> float:
     """Calculate bearing between two coordinates"""
     if dst.lon == src.lon:
@@ -98,6 +187,190 @@ def calc_distance(src: LatLon, dst: LatLon) -> float:
     return c * EARTH_RADIUS
 
 
+def calc_distance_haversine(src: LatLon, dst: LatLon) -> float:
+    """Calculate distance **in km** between two coordinates using the
+    haversine formula, which other than `calc_distance()` does not lose
+    precision for short distances"""
+    a = math.sin(math.radians(dst.lat - src.lat) / 2.0) ** 2 + math.cos(
+        math.radians(src.lat)
+    ) * math.cos(math.radians(dst.lat)) * (
+        math.sin(math.radians(dst.lon - src.lon) / 2.0) ** 2
+    )
+
+    return 2.0 * math.asin(min(1.0, math.sqrt(a))) * EARTH_RADIUS
+
+
+def calc_bearing_distance_flat(src: LatLon, dst: LatLon) -> tuple[float, float]:
+    """Approximate bearing and distance **in km** on the plane tangent to the
+    earth between both points (equirectangular projection). This is only
+    valid for short distances away from the poles, see FLAT_MAX_LAT,
+    FLAT_MAX_DISTANCE, FLAT_BEARING_ERROR and FLAT_DISTANCE_ERROR."""
+    x = (dst.lon - src.lon + 180.0) % 360.0 - 180.0
+    x *= math.cos(math.radians((src.lat + dst.lat) / 2.0))
+    y = dst.lat - src.lat
+
+    b = math.degrees(math.atan2(x, y))
+
+    return b + 360.0 if b < 0.0 else b, math.radians(math.hypot(x, y)) * EARTH_RADIUS
+
+
+def calc_bearing_distance(src: LatLon, dst: LatLon) -> tuple[float, float]:
+    """`calc_bearing()` and `calc_distance()` in one go"""
+    return calc_bearing(src, dst), calc_distance(src, dst)
+
+
+def calc_bearing_distance_haversine(src: LatLon, dst: LatLon) -> tuple[float, float]:
+    """`calc_bearing()` and `calc_distance_haversine()` in one go"""
+    return calc_bearing(src, dst), calc_distance_haversine(src, dst)
+
+
+def calc_bearing_batch(src_lat, src_lon, dst_lat, dst_lon) -> np.ndarray:
+    """Vectorised `calc_bearing()`, taking (broadcastable) arrays of
+    latitudes/longitudes in degrees instead of `LatLon`s"""
+    src_lat, src_lon, dst_lat, dst_lon = np.broadcast_arrays(
+        *(np.asarray(x, dtype=float) for x in (src_lat, src_lon, dst_lat, dst_lon))
+    )
+    delta = np.radians(dst_lon - src_lon)
+    slat = np.radians(src_lat)
+    dlat = np.radians(dst_lat)
+
+    b = np.degrees(
+        np.arctan2(
+            np.sin(delta),
+            np.cos(slat) * np.tan(dlat) - np.sin(slat) * np.cos(delta),
+        )
+    )
+
+    # Same meridian: due north or south, as in the scalar version
+    b = np.where(dst_lon == src_lon, np.where(dst_lat >= src_lat, 0.0, 180.0), b)
+
+    return np.where(b < 0.0, b + 360.0, b)
+
+
+def calc_distance_batch(src_lat, src_lon, dst_lat, dst_lon) -> np.ndarray:
+    """Vectorised `calc_distance()`, taking (broadcastable) arrays of
+    latitudes/longitudes in degrees instead of `LatLon`s"""
+    C = np.radians(np.asarray(dst_lon, dtype=float) - np.asarray(src_lon, dtype=float))
+    a = np.radians(np.asarray(src_lat, dtype=float))
+    b = np.radians(np.asarray(dst_lat, dtype=float))
+    c = np.arccos(
+        np.clip(np.sin(a) * np.sin(b) + np.cos(a) * np.cos(b) * np.cos(C), -1, 1)
+    )
+
+    return c * EARTH_RADIUS
+
+
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+def calc_bearing_trig(
+    src_lat, src_lon, dst_lat, dst_lon, dst_sin, dst_cos
+) -> np.ndarray:
+    """Vectorised `calc_bearing()` of (broadcastable) arrays of coordinates
+    **in radians**, with sine and cosine of the destination latitudes
+    precomputed"""
+    delta = dst_lon - src_lon
+
+    with np.errstate(divide="ignore"):
+        b = np.degrees(
+            np.arctan2(
+                np.sin(delta),
+                np.cos(src_lat) * dst_sin / dst_cos - np.sin(src_lat) * np.cos(delta),
+            )
+        )
+
+    b = np.where(delta == 0.0, np.where(dst_lat >= src_lat, 0.0, 180.0), b)
+
+    return np.where(b < 0.0, b + 360.0, b)
+
+
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+def calc_bearing_distance_trig(
+    src_lat, src_lon, dst_lat, dst_lon, dst_sin, dst_cos
+) -> tuple[np.ndarray, np.ndarray]:
+    """Calculate `calc_bearing_batch()` and `calc_distance_batch()` in one go
+    from (broadcastable) arrays of coordinates **in radians**, with sine and
+    cosine of the destination latitudes precomputed"""
+    c = np.arccos(
+        np.clip(
+            np.sin(src_lat) * dst_sin
+            + np.cos(src_lat) * dst_cos * np.cos(dst_lon - src_lon),
+            -1,
+            1,
+        )
+    )
+
+    return (
+        calc_bearing_trig(src_lat, src_lon, dst_lat, dst_lon, dst_sin, dst_cos),
+        c * EARTH_RADIUS,
+    )
+
+
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+def calc_bearing_distance_haversine_trig(
+    src_lat, src_lon, dst_lat, dst_lon, dst_sin, dst_cos
+) -> tuple[np.ndarray, np.ndarray]:
+    """Vectorised `calc_bearing_distance_haversine()`, taking arguments as
+    `calc_bearing_distance_trig()`"""
+    a = np.sin((dst_lat - src_lat) / 2.0) ** 2 + np.cos(src_lat) * dst_cos * (
+        np.sin((dst_lon - src_lon) / 2.0) ** 2
+    )
+
+    return (
+        calc_bearing_trig(src_lat, src_lon, dst_lat, dst_lon, dst_sin, dst_cos),
+        2.0 * np.arcsin(np.minimum(1.0, np.sqrt(a))) * EARTH_RADIUS,
+    )
+
+
+def calc_bearing_distance_flat_trig(
+    src_lat, src_lon, dst_lat, dst_lon, *_
+) -> tuple[np.ndarray, np.ndarray]:
+    """Vectorised `calc_bearing_distance_flat()`, taking arguments as
+    `calc_bearing_distance_trig()`"""
+    x = (dst_lon - src_lon + math.pi) % (2.0 * math.pi) - math.pi
+    x *= np.cos((src_lat + dst_lat) / 2.0)
+    y = dst_lat - src_lat
+
+    b = np.degrees(np.arctan2(x, y))
+
+    return np.where(b < 0.0, b + 360.0, b), np.hypot(x, y) * EARTH_RADIUS
+
+
+@dataclass(frozen=True)
+class Geometry:
+    """Geometry backend: `calc` calculates bearing and distance between two
+    `LatLon`s, `calc_trig` of arrays, as `calc_bearing_distance_trig()`.
+    Approximations are valid up to `max_lat` and `max_distance`, within
+    `bearing_error` and `distance_error`."""
+
+    calc: Callable[[LatLon, LatLon], tuple[float, float]]
+    calc_trig: Callable[..., tuple[np.ndarray, np.ndarray]]
+    bearing_error: float = 0.0
+    distance_error: float = 0.0
+    max_lat: float = 90.0
+    max_distance: float = math.inf
+
+    @property
+    def exact(self) -> bool:
+        """Whether results are exact, rather than approximated"""
+        return not (self.bearing_error or self.distance_error)
+
+
+# Selectable geometry backends, "spherical" being the exact reference
+GEOMETRIES = {
+    "spherical": Geometry(calc_bearing_distance, calc_bearing_distance_trig),
+    "haversine": Geometry(
+        calc_bearing_distance_haversine, calc_bearing_distance_haversine_trig
+    ),
+    "flat": Geometry(
+        calc_bearing_distance_flat,
+        calc_bearing_distance_flat_trig,
+        FLAT_BEARING_ERROR,
+        FLAT_DISTANCE_ERROR,
+        FLAT_MAX_LAT,
+        FLAT_MAX_DISTANCE,
+    ),
+}
+
+
 # pylint: disable=too-many-nested-blocks,too-many-branches,too-many-statements
 
 
@@ -211,3 +484,113 @@ def travel(origin: LatLon, dist: float, bear: float) -> LatLon:
                 pos.lon -= 360.0
 
     return pos
+
+
+def isclose_batch(a, b) -> np.ndarray:
+    """Vectorised `isclose()`, with the same symmetric tolerances,
+    other than `numpy.isclose()`"""
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+
+    return np.abs(a - b) <= np.maximum(1e-9 * np.maximum(np.abs(a), np.abs(b)), 1e-9)
+
+
+def wrap_lon_batch(lon: np.ndarray, mask: np.ndarray, close: bool) -> None:
+    """Let longitudes selected by `mask` be -180.0 .. 180.0°, in place, the same
+    way `travel()` does, step by step, so results are identical. With `close`,
+    longitudes close to -180.0° are wrapped to 180.0° as well."""
+    while True:
+        low = mask & (lon <= -180.0)
+
+        if close:
+            low |= mask & isclose_batch(lon, -180.0)
+
+        if not low.any():
+            break
+
+        lon[low] += 360.0
+
+    while True:
+        high = mask & (lon > 180.0)
+
+        if not high.any():
+            break
+
+        lon[high] -= 360.0
+
+
+# pylint: disable-next=too-many-locals
+def travel_batch(lat, lon, dist, bear) -> tuple[np.ndarray, np.ndarray]:
+    """Vectorised `travel()`, taking (broadcastable) arrays of latitudes,
+    longitudes, distances in km and bearings in degrees. Return arrays of
+    resulting latitudes and longitudes, following the same rules for the
+    poles and wrapping at ±180°. Where `travel()` would divide by zero,
+    starting exactly at a pole, results are NaN."""
+    lat, lon, dist, bear = (
+        np.array(x, dtype=float)
+        for x in np.broadcast_arrays(
+            *(np.asarray(x, dtype=float) for x in (lat, lon, dist, bear))
+        )
+    )
+    bear %= 360.0
+    res_lat = lat.copy()
+    res_lon = lon.copy()
+
+    moving = ~isclose_batch(dist, 0.0)
+    dist = dist / EARTH_RADIUS
+
+    north = moving & isclose_batch(bear, 0.0)
+    south = moving & ~north & isclose_batch(bear, 180.0)
+    east = moving & ~north & ~south & isclose_batch(bear, 90.0)
+    west = moving & ~north & ~south & ~east & isclose_batch(bear, 270.0)
+    other = moving & ~(north | south | east | west)
+
+    if np.any(north & (lat > 90.0)) or np.any(south & (lat < -90.0)):
+        raise ValueError
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Travelling north or south, along circles of longitude
+        deg = np.degrees(dist) % 360.0
+        t = np.where(north, lat + deg, lat - deg)
+        over = north & (t > 90.0) & (t <= 270.0)
+        under = south & (t < -90.0) & (t >= -270.0)
+        t = np.where(north & (t > 270.0), t - 360.0, t)
+        t = np.where(south & (t < -270.0), t + 360.0, t)
+        t = np.where(over, 180.0 - t, np.where(under, -180.0 - t, t))
+        res_lat = np.where(north | south, t, res_lat)
+        res_lon = np.where(
+            over | under, np.where(lon > 0.0, lon - 180.0, lon + 180.0), res_lon
+        )
+
+        # Travelling east or west, along circles of latitude
+        # At the poles, we go nowhere heading east or west...
+        sideways = (east | west) & ~(
+            isclose_batch(lat, 90.0) | isclose_batch(lat, -90.0)
+        )
+        step = np.degrees(dist) / np.cos(np.radians(lat))
+        res_lon = np.where(sideways, np.where(east, lon + step, lon - step), res_lon)
+        wrap_lon_batch(res_lon, sideways, True)
+
+        # Any other bearing
+        b = np.radians(90.0 - lat)
+        a = np.arccos(
+            np.clip(
+                np.cos(b) * np.cos(dist)
+                + np.sin(b) * np.sin(dist) * np.cos(np.radians(bear)),
+                -1,
+                1,
+            )
+        )
+        q = np.sin(a) * np.sin(b)
+        C = np.arccos(np.clip((np.cos(dist) - np.cos(a) * np.cos(b)) / q, -1, 1))
+        C = np.where(q == 0.0, np.nan, C)
+
+        res_lat = np.where(other, 90.0 - np.degrees(a), res_lat)
+        res_lon = np.where(
+            other,
+            np.where(bear > 180.0, lon - np.degrees(C), lon + np.degrees(C)),
+            res_lon,
+        )
+        wrap_lon_batch(res_lon, other, False)
+
+    return res_lat, res_lon
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+
+"""SQLite store of filtered HEMS states, as saved to `data/hems/<date>/*.json`,
+indexed by time, ICAO hex code and registration"""
+
+import argparse
+import json
+import sqlite3
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+from hemsfilter import DESC
+
+# Columns of table `states`, i.e. snapshot time and `DESC`
+COLUMNS = "time icao callsign reg squawk lat lon alt vrate track speed".split()
+
+
+def to_row(now: int, state: list) -> tuple:
+    """Convert a state into a row of `COLUMNS`, stripping callsign and reg"""
+    icao, callsign, reg, *values = state
+
+    return (
+        now,
+        icao,
+        callsign.strip() if callsign else callsign,
+        reg.strip() if reg else reg,
+        *values,
+    )
+
+
+class HemsStore:
+    """SQLite table of HEMS states, one row per aircraft and snapshot time.
+    Times of snapshots stored are recorded, so snapshots already stored are
+    ignored, and files may be ingested repeatedly.
+    """
+
+    def __init__(self, filename: Path, timeout: float = 30.0):
+        self.db = sqlite3.connect(filename, timeout=timeout)
+        self.db.executescript(
+            """CREATE TABLE IF NOT EXISTS states (
+                time INTEGER NOT NULL,
+                icao TEXT,
+                callsign TEXT,
+                reg TEXT,
+                squawk TEXT,
+                lat REAL,
+                lon REAL,
+                alt,
+                vrate REAL,
+                track REAL,
+                speed REAL
+            );
+            CREATE TABLE IF NOT EXISTS snapshots (
+                time INTEGER PRIMARY KEY
+            );
+            CREATE INDEX IF NOT EXISTS states_time ON states (time);
+            CREATE INDEX IF NOT EXISTS states_icao ON states (icao, time);
+            CREATE INDEX IF NOT EXISTS states_reg ON states (reg, time);
+            """
+        )
+        self.db.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        """Close database"""
+        self.db.close()
+
+    def ingest(self, hems: dict) -> int:
+        """Store the states of filtered HEMS data, as described by its `desc`.
+        Return the number of states added, 0 if the snapshot was stored before."""
+        desc = hems.get("desc", DESC)
+
+        if list(desc) != DESC:
+            raise ValueError(f"Unexpected desc: {desc}")
+
+        with self.db:
+            stored = self.db.execute(
+                "INSERT OR IGNORE INTO snapshots VALUES (?)", (hems["time"],)
+            ).rowcount
+
+            if not stored:
+                return 0
+
+            return self.db.executemany(
+                f"INSERT INTO states VALUES ({', '.join('?' * len(COLUMNS))})",
+                [to_row(hems["time"], state) for state in hems["states"]],
+            ).rowcount
+
+    def ingest_file(self, filename: Path) -> int:
+        """Store the states of a `data/hems/<date>/*.json` file"""
+        with open(filename, "r", encoding="utf-8") as file:
+            return self.ingest(json.load(file))
+
+    # pylint: disable-next=too-many-arguments,too-many-positional-arguments
+    def query(
+        self,
+        icao: Optional[str] = None,
+        reg: Optional[str] = None,
+        callsign: Optional[str] = None,
+        since: Optional[int] = None,
+        until: Optional[int] = None,
+    ) -> list[tuple]:
+        """Return states matching all criteria given, ordered by time,
+        as tuples of `COLUMNS`. `until` is exclusive."""
+        where = []
+        params = []
+
+        for condition, value in [
+            ("icao = ?", icao),
+            ("reg = ?", reg),
+            ("callsign = ?", callsign),
+            ("time >= ?", since),
+            ("time < ?", until),
+        ]:
+            if value is not None:
+                where.append(condition)
+                params.append(value)
+
+        return self.db.execute(
+            "SELECT * FROM states"
+            + (f" WHERE {' AND '.join(where)}" if where else "")
+            + " ORDER BY time, icao",
+            params,
+        ).fetchall()
+
+
+def import_tree(store: HemsStore, root: Path) -> tuple[int, int]:
+    """Ingest all `root/<date>/*.json` files.
+    Return the number of files and states added."""
+    files = 0
+    states = 0
+
+    for filename in sorted(Path(root).glob("*/*.json")):
+        try:
+            states += store.ingest_file(filename)
+            files += 1
+        except (json.JSONDecodeError, KeyError, ValueError) as exception:
+            print(f"'{filename}': {exception}", file=sys.stderr)
+
+    return files, states
+
+
+def parse_time(value: str) -> int:
+    """Parse seconds since the epoch, or a local ISO date/time"""
+    try:
+        return int(value)
+    except ValueError:
+        return int(datetime.fromisoformat(value).timestamp())
+
+
+def main() -> int:
+    """Import the JSON tree, or query states"""
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("db", type=Path, help="data/hems.db")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("import", help="import data/hems/<date>/*.json")
+    command.add_argument("root", type=Path)
+
+    command = commands.add_parser("query", help="print states")
+    command.add_argument("--icao", default=None)
+    command.add_argument("--reg", default=None)
+    command.add_argument("--callsign", default=None)
+    command.add_argument("--since", type=parse_time, default=None)
+    command.add_argument("--until", type=parse_time, default=None)
+    command.add_argument("--json", action="store_true")
+
+    args = parser.parse_args()
+
+    with HemsStore(args.db) as store:
+        if args.command == "import":
+            files, states = import_tree(store, args.root)
+            print(f"{files} file(s), {states} state(s) imported")
+            return 0
+
+        rows = store.query(args.icao, args.reg, args.callsign, args.since, args.until)
+
+    if args.json:
+        print(json.dumps([dict(zip(COLUMNS, row)) for row in rows], indent=4))
+    else:
+        for row in rows:
+            time = datetime.fromtimestamp(row[0]).isoformat(timespec="seconds")
+            print(time, *("-" if value is None else value for value in row[1:]))
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
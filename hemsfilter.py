@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+
+"""Filter HEMS from ADS-B data, as retrieved from adsbexchange.com,
+by squawk and callsign. This produces the same `desc`/`states` structure
+as the `jq` filter formerly used in query-adsb.sh.
+"""
+
+import json
+import re
+import time
+from typing import Any, Iterator, Optional, TextIO
+
+SQUAWKS = ("0020", "0034")
+
+CALLSIGNS = re.compile(
+    r"^(AIRESC|C|CH(R|XE?)|DOC|DRAGO|KR|LAS|LIFELN|MEDIC|NHX|RESQ|RGA|RK|SA(MU|REX))"
+    r"[0-9]+[A-Z]* *"
+)
+
+DESC = [
+    "icao24",
+    "callsign",
+    "reg",
+    "squawk",
+    "lat",
+    "lon",
+    "alt(baro)[ft]",
+    "vrate(baro)[ft/min]",
+    "track[deg]",
+    "groundspeed[kts]",
+]
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+# Keys in adsbexchange.com data corresponding to `DESC`
+FIELDS = (
+    "hex",
+    "flight",
+    "r",
+    "squawk",
+    "lat",
+    "lon",
+    "alt_baro",
+    "baro_rate",
+    "track",
+    "gs",
+)
+
+
+def is_hems(aircraft: dict) -> bool:
+    """Determine whether an aircraft is a HEMS by squawk or callsign"""
+    return aircraft.get("squawk") in SQUAWKS or bool(
+        CALLSIGNS.match(aircraft.get("flight") or "")
+    )
+
+
+def to_state(aircraft: dict) -> list:
+    """Convert aircraft data into a state as described by `DESC`"""
+    return [aircraft.get(key) for key in FIELDS]
+
+
+def jq_order(value) -> tuple:
+    """Sort key ordering JSON values the way `jq` does:
+    null < false < true < numbers < strings < arrays < objects"""
+    # pylint: disable=too-many-return-statements
+    if value is None:
+        return (0,)
+    if value is False:
+        return (1,)
+    if value is True:
+        return (2,)
+    if isinstance(value, (int, float)):
+        return (3, value)
+    if isinstance(value, str):
+        return (4, value)
+    if isinstance(value, list):
+        return (5, [jq_order(v) for v in value])
+    return (6, sorted((k, jq_order(v)) for k, v in value.items()))
+
+
+def unique_states(states) -> list[list]:
+    """Sort and deduplicate states, like `jq`'s `unique`"""
+    result = []
+
+    for state in sorted(states, key=jq_order):
+        if not result or result[-1] != state:
+            result.append(state)
+
+    return result
+
+
+def filter_adsb(adsb: dict, now: Optional[int] = None) -> dict:
+    """Filter HEMS from ADS-B data. `time` is set to `now`, defaulting to the
+    time of the response, if contained, else the current time."""
+
+    if now is None:
+        now = int(adsb["now"] / 1000) if adsb.get("now") else int(time.time())
+
+    return {
+        "time": now,
+        "desc": DESC,
+        "states": unique_states(
+            to_state(aircraft) for aircraft in adsb.get("ac") or [] if is_hems(aircraft)
+        ),
+    }
+
+
+class JsonStream:
+    """Incrementally read JSON values from a text file, chunk by chunk,
+    keeping only what has not been consumed yet in memory"""
+
+    decoder = json.JSONDecoder()
+
+    def __init__(self, file: TextIO, chunk_size: int = 65536):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Append the next chunk, dropping consumed data. Return False on EOF."""
+        chunk = "" if self.eof else self.file.read(self.chunk_size)
+
+        if not chunk:
+            self.eof = True
+            return False
+
+        self.buf = self.buf[self.pos :] + chunk
+        self.pos = 0
+
+        return True
+
+    def peek(self) -> str:
+        """Skip whitespace, return next character, or "" on EOF"""
+        while True:
+            self.pos = WHITESPACE.match(self.buf, self.pos).end()
+
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+
+            if not self.fill():
+                return ""
+
+    def expect(self, char: str) -> None:
+        """Consume `char`, raise if anything else comes next"""
+        if self.peek() != char:
+            raise json.JSONDecodeError(f"Expecting '{char}'", self.buf, self.pos)
+
+        self.pos += 1
+
+    def value(self) -> Any:
+        """Consume and return the next complete JSON value"""
+        self.peek()
+
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+
+                # A number at the end of the buffer might continue in the next chunk
+                if self.eof or (
+                    end < len(self.buf)
+                    and not (
+                        isinstance(value, (int, float))
+                        and self.buf[end] in "+-.0123456789Ee"
+                    )
+                ):
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+
+            self.fill()
+
+
+def iter_json_object(
+    file: TextIO, array_key: str = "ac", chunk_size: int = 65536
+) -> Iterator[tuple[str, Any]]:
+    """Yield (key, value) pairs of the JSON object read from `file`.
+    Elements of the array named `array_key` are yielded one by one instead,
+    as (`array_key` + "[]", element), so the array is never held in memory."""
+
+    stream = JsonStream(file, chunk_size)
+    stream.expect("{")
+
+    if stream.peek() == "}":
+        return
+
+    while True:
+        key = stream.value()
+
+        if not isinstance(key, str):
+            raise json.JSONDecodeError(
+                "Expecting property name", stream.buf, stream.pos
+            )
+
+        stream.expect(":")
+
+        if key == array_key and stream.peek() == "[":
+            stream.pos += 1
+
+            if stream.peek() == "]":
+                stream.pos += 1
+            else:
+                while True:
+                    yield f"{key}[]", stream.value()
+
+                    if stream.peek() != ",":
+                        stream.expect("]")
+                        break
+
+                    stream.pos += 1
+        else:
+            yield key, stream.value()
+
+        if stream.peek() != ",":
+            stream.expect("}")
+            return
+
+        stream.pos += 1
+
+
+def filter_adsb_stream(
+    file: TextIO, now: Optional[int] = None, chunk_size: int = 65536
+) -> dict:
+    """Same as `filter_adsb()`, but reading ADS-B data from `file` incrementally,
+    one aircraft at a time, keeping only HEMS"""
+
+    adsb = {"ac": []}
+
+    for key, value in iter_json_object(file, "ac", chunk_size):
+        if key == "ac[]":
+            if is_hems(value):
+                adsb["ac"].append(value)
+        elif key != "ac":
+            adsb[key] = value
+
+    return filter_adsb(adsb, now)
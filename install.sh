@@ -18,13 +18,6 @@ _trap()
 
 trap '_trap $? $LINENO' ERR
 
-# query-adsb.sh needs `jq`
-dpkg -l jq &>/dev/null ||
-{
-	echo "jq not installed." >&2
-	exit 1
-}
-
 if [ -f "$HOME/hems-lookout.conf" ]; then
 	source "$HOME/hems-lookout.conf"
 fi
@@ -44,9 +37,16 @@ fi
 
 readonly SCRIPTDIR=$(realpath "$(dirname "${BASH_SOURCE[0]}")")
 
-# Setup venv
+# Setup venv, build onefile (default) or onedir executable,
+# the latter starting faster, as it needs no unpacking
 uv sync
-uv run pyinstaller notify.spec
+
+if [[ ${HEMS_LOOKOUT_BUILD:-} = onedir ]]; then
+	uv run pyinstaller notify-onedir.spec
+else
+	rm -rf dist/notify-onedir
+	uv run pyinstaller notify.spec
+fi
 
 # Adjust crontab
 crontab < <(
@@ -0,0 +1,198 @@
+"""Counters, gauges and histograms of the processing pipeline, written in the
+Prometheus text exposition format, e.g. for node_exporter's textfile collector
+"""
+
+import itertools
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+PREFIX = "hems_lookout_"
+
+# Upper bounds in seconds, up to the 3 minute interval of query-adsb.sh
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BUCKETS += (60.0, 120.0, 180.0)
+
+# Type and help text of each metric, without PREFIX
+DESCRIPTIONS = {
+    "files_total": ("counter", "Snapshot files processed"),
+    "states_total": ("counter", "ADS-B states evaluated"),
+    "states_rejected_total": ("counter", "States rejected as insufficient"),
+    "states_malformed_total": ("counter", "States skipped as malformed"),
+    "pairs_total": ("counter", "Aircraft/POI pairs evaluated"),
+    "notifications_total": ("counter", "Notifications sent or printed"),
+    "fcm_sent_total": ("counter", "Messages accepted by FCM"),
+    "fcm_errors_total": ("counter", "Messages rejected by FCM, by error code"),
+    "fcm_send_seconds": ("histogram", "Duration of FCM requests"),
+    "stage_seconds": ("histogram", "Duration of pipeline stages"),
+    "log_dropped_total": ("counter", "Log records dropped, as the queue was full"),
+    "run_seconds": ("gauge", "Duration of the last run, including fetch"),
+    "last_run_timestamp_seconds": ("gauge", "End of the last run"),
+}
+
+
+def format_labels(labels: tuple) -> str:
+    """Return labels as `{name="value",...}`, escaped"""
+    if not labels:
+        return ""
+
+    def escape(value) -> str:
+        return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels) + "}"
+
+
+def format_value(value: float) -> str:
+    """Return `value` with full precision, e.g. for timestamps, integral values
+    without a fraction"""
+    value = float(value)
+
+    if math.isnan(value):
+        return "NaN"
+
+    if math.isinf(value):
+        return "+Inf" if value > 0.0 else "-Inf"
+
+    if value.is_integer() and abs(value) < 2.0**53:
+        return str(int(value))
+
+    return repr(value)
+
+
+class Metrics:
+    """Thread safe registry of metrics, keyed by name and labels.
+
+    Worker processes `collect()` their metrics, which the parent `merge()`s.
+    """
+
+    def __init__(self, buckets: tuple = BUCKETS):
+        self.lock = threading.Lock()
+        self.buckets = buckets
+        self.values = {}
+        self.histograms = {}
+
+    def reset(self) -> None:
+        """Forget all values"""
+        with self.lock:
+            self.values = {}
+            self.histograms = {}
+
+    def inc(self, name: str, value: float = 1.0, **labels) -> None:
+        """Increment counter `name`"""
+        key = (name, tuple(sorted(labels.items())))
+
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels) -> None:
+        """Set gauge `name`"""
+        with self.lock:
+            self.values[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Record `value` in histogram `name`"""
+        key = (name, tuple(sorted(labels.items())))
+
+        with self.lock:
+            # Count per bucket (not cumulative), then sum and count
+            counts = self.histograms.setdefault(key, [0] * len(self.buckets) + [0, 0])
+
+            for n, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[n] += 1
+                    break
+
+            counts[-2] += value
+            counts[-1] += 1
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """Record the duration of the `with` block in histogram `name`"""
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def collect(self) -> dict:
+        """Return all values, e.g. to be passed from a worker process"""
+        with self.lock:
+            return {
+                "values": dict(self.values),
+                "histograms": {k: list(v) for k, v in self.histograms.items()},
+            }
+
+    def merge(self, collected: dict) -> None:
+        """Add values returned by `collect()`. Gauges are replaced."""
+        with self.lock:
+            for key, value in collected["values"].items():
+                if DESCRIPTIONS.get(key[0], ("counter",))[0] == "gauge":
+                    self.values[key] = value
+                else:
+                    self.values[key] = self.values.get(key, 0.0) + value
+
+            for key, counts in collected["histograms"].items():
+                mine = self.histograms.setdefault(key, [0] * len(counts))
+                self.histograms[key] = [a + b for a, b in zip(mine, counts)]
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text format"""
+        lines = []
+        collected = self.collect()
+        names = sorted(
+            {name for name, _ in collected["values"]}
+            | {name for name, _ in collected["histograms"]}
+        )
+
+        for name in names:
+            kind, text = DESCRIPTIONS.get(name, ("untyped", name))
+            lines.append(f"# HELP {PREFIX}{name} {text}")
+            lines.append(f"# TYPE {PREFIX}{name} {kind}")
+
+            for (metric, labels), value in sorted(collected["values"].items()):
+                if metric == name:
+                    lines.append(
+                        f"{PREFIX}{name}{format_labels(labels)} {format_value(value)}"
+                    )
+
+            for (metric, labels), counts in sorted(collected["histograms"].items()):
+                if metric == name:
+                    lines += self.render_histogram(PREFIX + name, labels, counts)
+
+        return "\n".join(lines) + "\n"
+
+    def render_histogram(self, name: str, labels: tuple, counts: list) -> list[str]:
+        """Return the lines of a histogram, with cumulative buckets"""
+        *counts, total, count = counts
+        lines = []
+
+        for bound, cumulative in zip(
+            [f"{bound:g}" for bound in self.buckets] + ["+Inf"],
+            list(itertools.accumulate(counts)) + [count],
+        ):
+            lines.append(
+                f"{name}_bucket{format_labels(labels + (('le', bound),))} {cumulative}"
+            )
+
+        lines.append(f"{name}_sum{format_labels(labels)} {format_value(total)}")
+        lines.append(f"{name}_count{format_labels(labels)} {count}")
+
+        return lines
+
+    def write(self, filename: Path) -> None:
+        """Atomically replace `filename`, so it is never read incomplete"""
+        tmp = Path(f"{filename}.tmp")
+
+        with open(tmp, "w", encoding="utf-8") as file:
+            file.write(self.render())
+
+        os.replace(tmp, filename)
+
+
+# Metrics of this process
+METRICS = Metrics()
@@ -0,0 +1,47 @@
+# -*- mode: python ; coding: utf-8 -*-
+
+# Same as notify.spec, but build into dist/notify-onedir/ instead of a onefile
+# executable, so it does not need to be unpacked on every start.
+
+a = Analysis(
+    ['notify.py'],
+    pathex=[],
+    binaries=[],
+    datas=[],
+    hiddenimports=[],
+    hookspath=[],
+    hooksconfig={},
+    runtime_hooks=[],
+    excludes=[],
+    noarchive=False,
+    optimize=2,
+)
+pyz = PYZ(a.pure)
+
+exe = EXE(
+    pyz,
+    a.scripts,
+    [('O', None, 'OPTION'), ('O', None, 'OPTION')],
+    exclude_binaries=True,
+    name='notify',
+    debug=False,
+    bootloader_ignore_signals=False,
+    strip=True,
+    upx=True,
+    console=True,
+    disable_windowed_traceback=False,
+    argv_emulation=False,
+    target_arch=None,
+    codesign_identity=None,
+    entitlements_file=None,
+)
+
+coll = COLLECT(
+    exe,
+    a.binaries,
+    a.datas,
+    strip=True,
+    upx=True,
+    upx_exclude=[],
+    name='notify-onedir',
+)
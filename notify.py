@@ -4,38 +4,139 @@
 towards one of the user defined destinations within a certain distance.
 """
 
+# pylint: disable=too-many-lines
+
 import argparse
 import os
 import json
 import logging
+import logging.handlers
+import multiprocessing
+import queue
+import signal
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from dataclasses import dataclass
+from typing import Optional, Union
 from datetime import datetime
 from pathlib import Path
-import firebase_admin
-from firebase_admin import credentials
-from firebase_admin import messaging  # pylint: disable=unused-import
+import numpy as np
 from gcmath import (
+    GEOMETRIES,
+    Geometry,
     LatLon,
-    calc_bearing,
-    calc_distance,
+    in_bounding_box,
+    in_bounding_box_batch,
+    lon_limit_batch,
 )
+from cooldown import CooldownStore
+from hemsdb import HemsStore
+from hemsfilter import DESC, filter_adsb_stream
+from metrics import METRICS
+from pois import TOPIC_PREFIX, PoiTable
+from segments import SegmentLog, archive
+from topics import TopicStore, sync
+from tracks import TrackHistory
+from watcher import SnapshotWatcher, write_heartbeat
 
 TRACK_DEVIATION = 5  # degrees
 MAX_DISTANCE = 70  # km
+GEOMETRY = "spherical"  # one of gcmath.GEOMETRIES
+FCM_BATCH_SIZE = 500  # messages per request, as limited by FCM
+STARTUP_BUDGET = 2.0  # s from process start until ready to process data
+LOG_QUEUE_SIZE = 10000  # records waiting to be written, dropped beyond
+LOG_MAX_BYTES = 10 * 1024 * 1024  # of hems-lookout.log before being rotated
+LOG_BACKUPS = 5  # rotated logs kept
+LOG_FORMAT = "%(asctime)s %(filename)s(%(lineno)d): %(message)s"  # on stderr
+
+IMPORTED = time.perf_counter()
+
+
+def uptime() -> float:
+    """Return seconds since process start, or since import where unknown"""
+    try:
+        with open("/proc/self/stat", "r", encoding="ascii") as file:
+            # Skip pid and command, which might contain spaces
+            started = int(file.read().rsplit(")", 1)[1].split()[19])
+
+        with open("/proc/uptime", "r", encoding="ascii") as file:
+            return float(file.read().split()[0]) - started / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.perf_counter() - IMPORTED
+
+
+class StartupTimer:
+    """Collect durations of startup phases, beginning with process start"""
+
+    def __init__(self):
+        self.phases = [("interpreter and imports", uptime())]
+        self.last = time.perf_counter()
+
+    def lap(self, phase: str) -> None:
+        """Record the duration of `phase`, since the previous one"""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self.last))
+        self.last = now
+
+    @property
+    def total(self) -> float:
+        """Time from process start to the end of the last phase"""
+        return sum(duration for _, duration in self.phases)
+
+    def check(self, budget: float, report: bool = False) -> None:
+        """Warn if startup exceeded `budget`, print report if requested"""
+        if report:
+            print(self.report(), file=sys.stderr)
+
+        if self.total > budget:
+            logging.warning(
+                "Startup took %.0f ms, exceeding budget of %.0f ms",
+                self.total * 1000.0,
+                budget * 1000.0,
+            )
+
+    def report(self) -> str:
+        """Return phases and their durations as text"""
+        return "\n".join(
+            f"{phase:24} {duration * 1000.0:8.1f} ms"
+            for phase, duration in self.phases + [("total", self.total)]
+        )
 
 
 class InsufficientData(Exception):
     """Do nothing"""
 
 
-@dataclass
 class AicraftState:
-    """Data class to be initialised from dict, as read from data/hems/**.json.
-    Raises InsufficientData exception in constructor, if essential values are missing.
+    """Aircraft state to be initialised from list, as read from data/hems/**.json.
+    Raises InsufficientData exception in constructor, if essential values are
+    missing or the aircraft is on ground. Use `from_states()` to validate many
+    states at once without exceptions.
     """
 
-    # pylint: disable=too-many-instance-attributes
+    # pylint: disable=too-many-instance-attributes,too-few-public-methods
+
+    __slots__ = (
+        "icao",
+        "callsign",
+        "reg",
+        "squawk",
+        "alt",
+        "vrate",
+        "track",
+        "speed",
+        "pos",
+    )
+
     def __init__(self, state: list):
+        if not self._assign(state):
+            raise InsufficientData
+
+    def _assign(self, state: list, require_track: bool = True) -> bool:
+        """Assign values from `state`, return whether they are sufficient"""
         # fmt: off
         (
             # Comments below denote possible different types
@@ -52,13 +153,17 @@ class AicraftState:
         ) = state
         # fmt: on
 
-        if not any([self.icao, self.callsign, self.reg]):
+        if not (self.icao or self.callsign or self.reg):
             # We want at least _something_ to report...
-            raise InsufficientData
+            return False
 
-        if None in [lat, lon, self.track]:
+        if lat is None or lon is None or (require_track and self.track is None):
             # Cannot calculate anything...
-            raise InsufficientData
+            return False
+
+        if self.alt == "ground":
+            # Not heading anywhere (yet)
+            return False
 
         self.callsign = self.callsign.strip() if self.callsign else ""
         self.reg = self.reg.strip() if self.reg else ""
@@ -69,6 +174,36 @@ class AicraftState:
 
         self.pos = LatLon(lat, lon)
 
+        return True
+
+    @classmethod
+    def from_states(
+        cls, data: list[list], require_track: bool = True
+    ) -> tuple[list["AicraftState"], int]:
+        """Create states from a list of lists, skipping insufficient or malformed
+        ones, i.e. not matching `hemsfilter.DESC`, which are logged and counted
+        separately. Without `require_track`, states without track are accepted,
+        so it can be derived from previous positions.
+        Return valid states and the number of rejected insufficient ones."""
+        states = []
+        malformed = 0
+
+        for values in data:
+            if not isinstance(values, list) or len(values) != len(DESC):
+                logging.error("Malformed state: %s", values)
+                malformed += 1
+                continue
+
+            state = cls.__new__(cls)
+
+            if state._assign(values, require_track):
+                states.append(state)
+
+        if malformed:
+            METRICS.inc("states_malformed_total", malformed)
+
+        return states, len(data) - len(states) - malformed
+
 
 @dataclass
 class Message:
@@ -90,36 +225,64 @@ class Message:
         )
 
 
+def firebase():
+    """Return the `firebase_admin` module, which is imported upon first use only,
+    as this takes quite some time, not needed for e.g. `--stdout`"""
+    # pylint: disable=import-outside-toplevel
+    import firebase_admin
+    import firebase_admin.credentials
+    import firebase_admin.exceptions
+    import firebase_admin.messaging
+
+    return firebase_admin
+
+
 def fcm_init(filename: Path) -> None:
     """Initialise messaging app from service accout key data JSON file"""
-    firebase_admin.initialize_app(credentials.Certificate(filename))
+    firebase_admin = firebase()
+    firebase_admin.initialize_app(firebase_admin.credentials.Certificate(filename))
 
 
 def fcm_terminate() -> None:
     """Release internal app object. Only for testing."""
+    firebase_admin = firebase()
     firebase_admin.delete_app(firebase_admin.get_app())
 
 
-def fcm_send(recipient: str, message: Message, dry_run=False) -> None:
-    """Send a notification via Firebase Cloud Messaging"""
-
-    try:
-        # https://firebase.google.com/docs/reference/admin/python/firebase_admin.messaging
-        wrap = firebase_admin.messaging.Message(
-            token=recipient,
+def fcm_message(recipient: str, message: Message):
+    """Wrap notification message data into an FCM message, sent to a token
+    or, if `recipient` starts with TOPIC_PREFIX, to a topic"""
+    # https://firebase.google.com/docs/reference/admin/python/firebase_admin.messaging
+    if recipient.startswith(TOPIC_PREFIX):
+        return firebase().messaging.Message(
+            topic=recipient[len(TOPIC_PREFIX) :],
             notification=None,
             data=message.__dict__,
         )
 
-        fcmlog.info("? %s", message)
-        firebase_admin.messaging.send(wrap, dry_run)
-        fcmlog.info("=")
+    return firebase().messaging.Message(
+        token=recipient,
+        notification=None,
+        data=message.__dict__,
+    )
+
+
+def fcm_error_code(ex: Exception) -> str:
+    """Return the FCM error code of `ex`, else its type"""
+    return getattr(ex, "code", None) or type(ex).__name__
 
-    except firebase_admin.exceptions.NotFoundError:
+
+def fcm_log_error(recipient: str, ex: Exception) -> None:
+    """Log an exception raised while sending to `recipient`"""
+
+    firebase_admin = firebase()
+    METRICS.inc("fcm_errors_total", code=fcm_error_code(ex))
+
+    if isinstance(ex, firebase_admin.exceptions.NotFoundError):
         msg = f"Token '{recipient}' not found."
         logging.warning(msg)
         fcmlog.warning("! %s", msg)
-    except firebase_admin.exceptions.FirebaseError as ex:
+    elif isinstance(ex, firebase_admin.exceptions.FirebaseError):
         msg = (
             f"{ex.code if ex.code else 'UNKNOWN CODE'}: "
             f"{ex.cause if ex.cause else 'UNKNOWN CAUSE'}: "
@@ -127,102 +290,903 @@ def fcm_send(recipient: str, message: Message, dry_run=False) -> None:
         )
         logging.error(msg)
         fcmlog.error("! %s", msg)
-    # pylint: disable=broad-exception-caught
-    except Exception as ex:
+    else:
         logging.error("%s", ex)
         fcmlog.error("! %s", ex)
 
 
+def fcm_send(recipient: str, message: Message, dry_run=False) -> None:
+    """Send a notification via Firebase Cloud Messaging"""
+
+    try:
+        wrap = fcm_message(recipient, message)
+
+        fcmlog.info("? %s", message)
+
+        with METRICS.timer("fcm_send_seconds"):
+            firebase().messaging.send(wrap, dry_run)
+
+        fcmlog.info("=")
+        METRICS.inc("fcm_sent_total")
+
+    # pylint: disable=broad-exception-caught
+    except Exception as ex:
+        fcm_log_error(recipient, ex)
+
+
+def fcm_send_each(notifications: list[dict], dry_run=False) -> list[Exception]:
+    """Send up to `FCM_BATCH_SIZE` notifications in one request.
+    Return the exception for each notification, None on success."""
+
+    try:
+        messages = [fcm_message(n["recipient"], n["message"]) for n in notifications]
+
+        with METRICS.timer("fcm_send_seconds"):
+            response = firebase().messaging.send_each(messages, dry_run)
+
+        return [resp.exception for resp in response.responses]
+
+    # pylint: disable=broad-exception-caught
+    except Exception as ex:
+        # The whole request failed
+        return [ex] * len(notifications)
+
+
+def fcm_log_result(notification: dict, ex: Exception) -> None:
+    """Log the result of sending a notification to fcmlog"""
+
+    with fcmlog_lock:
+        fcmlog.info("? %s", notification["message"])
+
+        if ex:
+            fcm_log_error(notification["recipient"], ex)
+        else:
+            fcmlog.info("=")
+            METRICS.inc("fcm_sent_total")
+
+
+def fcm_send_batch(notifications: list[dict], dry_run=False) -> list[dict]:
+    """Send notifications via Firebase Cloud Messaging, submitting up to
+    `FCM_BATCH_SIZE` messages per request. Results are logged per message.
+    Return the notifications sent successfully."""
+    sent = []
+
+    for start in range(0, len(notifications), FCM_BATCH_SIZE):
+        chunk = notifications[start : start + FCM_BATCH_SIZE]
+
+        for notification, ex in zip(chunk, fcm_send_each(chunk, dry_run)):
+            fcm_log_result(notification, ex)
+
+            if not ex:
+                sent.append(notification)
+
+    return sent
+
+
+class FcmDispatcher:
+    """Send notifications from a bounded pool of worker threads.
+
+    Notifications are spread over at most `workers` concurrent requests of
+    up to `FCM_BATCH_SIZE` messages each. Messages failing with a transient
+    error are retried up to `retries` times, waiting with exponential backoff
+    and jitter in between, so one slow or failing request does not hold up
+    all others.
+    """
+
+    def __init__(self, workers=4, retries=3, backoff=0.5, max_backoff=8.0):
+        if workers < 1:
+            raise ValueError(f"At least one worker required, not {workers}")
+
+        exceptions = firebase().exceptions
+        self.transient_errors = (
+            exceptions.DeadlineExceededError,
+            exceptions.InternalError,
+            exceptions.ResourceExhaustedError,
+            exceptions.UnavailableError,
+        )
+        self.workers = workers
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="fcm"
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        """Wait for pending notifications to be sent, then stop workers"""
+        self.executor.shutdown(wait=True)
+
+    def delay(self, attempt: int) -> float:
+        """Time to wait before retry no. `attempt`"""
+        delay = min(self.max_backoff, self.backoff * 2**attempt)
+        return delay / 2.0 + random.uniform(0.0, delay / 2.0)
+
+    def send(self, notifications: list[dict], dry_run=False) -> list[dict]:
+        """Send notifications in one request, retrying transient errors.
+        Return the notifications sent successfully."""
+        sent = []
+
+        for attempt in range(self.retries + 1):
+            retry = []
+
+            for notification, ex in zip(
+                notifications, fcm_send_each(notifications, dry_run)
+            ):
+                if isinstance(ex, self.transient_errors) and attempt < self.retries:
+                    retry.append(notification)
+                else:
+                    fcm_log_result(notification, ex)
+
+                    if not ex:
+                        sent.append(notification)
+
+            if not retry:
+                break
+
+            notifications = retry
+            delay = self.delay(attempt)
+            logging.info("Retrying %d message(s) in %.1fs", len(retry), delay)
+            time.sleep(delay)
+
+        return sent
+
+    def dispatch(self, notifications: list[dict], dry_run=False) -> list[dict]:
+        """Spread notifications over the workers and wait until all are sent.
+        Return the notifications sent successfully."""
+
+        if not notifications:
+            return []
+
+        size = min(FCM_BATCH_SIZE, -(-len(notifications) // self.workers))
+        futures = [
+            self.executor.submit(
+                self.send, notifications[start : start + size], dry_run
+            )
+            for start in range(0, len(notifications), size)
+        ]
+
+        return [notification for future in futures for notification in future.result()]
+
+
+def isnotifyable_approx(
+    state: AicraftState, poi: LatLon, geometry: Geometry
+) -> Optional[bool]:
+    """Determine whether notifications shall be sent for an AicraftState using
+    an approximating `geometry`. Return None if this cannot be decided,
+    because the state is too close to a pole, or bearing or distance are
+    within the approximation's error of TRACK_DEVIATION or MAX_DISTANCE."""
+    if abs(state.pos.lat) > geometry.max_lat or MAX_DISTANCE > geometry.max_distance:
+        return None
+
+    bearing, dist = geometry.calc(state.pos, poi)
+    deviation = abs((bearing - state.track + 180.0) % 360.0 - 180.0)
+
+    if (
+        deviation > TRACK_DEVIATION + geometry.bearing_error
+        or dist > MAX_DISTANCE + geometry.distance_error
+    ):
+        return False
+
+    if (
+        deviation < TRACK_DEVIATION - geometry.bearing_error
+        and dist < MAX_DISTANCE - geometry.distance_error
+    ):
+        return True
+
+    return None
+
+
 def isnotifyable(state: AicraftState, poi: LatLon) -> bool:
-    """Determine whether notifications shall be sent for an AicraftState"""
-    bearing = calc_bearing(state.pos, poi)
-    deviation = bearing - state.track
+    """Determine whether notifications shall be sent for an AicraftState,
+    calculating bearing and distance by `GEOMETRIES[GEOMETRY]`.
+    POIs outside the bounding box are rejected without any trigonometry.
+    With an approximating geometry, the exact spherical calculation is only
+    done where the approximation is too close to call."""
+    if not in_bounding_box(state.pos, poi, MAX_DISTANCE):
+        return False
+
+    geometry = GEOMETRIES[GEOMETRY]
+
+    if not geometry.exact:
+        notifyable = isnotifyable_approx(state, poi, geometry)
+
+        if notifyable is not None:
+            return notifyable
+
+        geometry = GEOMETRIES["spherical"]
+
+    bearing, dist = geometry.calc(state.pos, poi)
 
     # Catch track/bearing wrapping around 0°
-    deviation = (deviation + 180.0) % 360.0 - 180.0
+    deviation = (bearing - state.track + 180.0) % 360.0 - 180.0
+
+    return abs(deviation) <= TRACK_DEVIATION and dist <= MAX_DISTANCE
+
 
-    if abs(deviation) <= TRACK_DEVIATION:
-        dist = calc_distance(state.pos, poi)
+def isnotifyable_course(bearing, track, dist) -> np.ndarray:
+    """Vectorised check of bearing to POI against track and distance"""
+    deviation = np.asarray(bearing) - track
 
-        if dist <= MAX_DISTANCE:
-            return True
+    # Catch track/bearing wrapping around 0°
+    deviation = (deviation + 180.0) % 360.0 - 180.0
 
-    return False
+    return (np.abs(deviation) <= TRACK_DEVIATION) & (np.asarray(dist) <= MAX_DISTANCE)
+
+
+def isnotifyable_approx_batch(
+    bearing, track, dist, lat, geometry: Geometry
+) -> tuple[np.ndarray, np.ndarray]:
+    """Vectorised `isnotifyable_approx()`, given bearing and distance calculated
+    by `geometry`. Return whether to notify and whether this could not be
+    decided, in which case the former is False."""
+    deviation = np.abs((bearing - track + 180.0) % 360.0 - 180.0)
+
+    off = (deviation > TRACK_DEVIATION + geometry.bearing_error) | (
+        dist > MAX_DISTANCE + geometry.distance_error
+    )
+    on = (deviation < TRACK_DEVIATION - geometry.bearing_error) & (
+        dist < MAX_DISTANCE - geometry.distance_error
+    )
+    undecided = ~(off | on)
+
+    if MAX_DISTANCE > geometry.max_distance:
+        undecided[:] = True
+    else:
+        undecided |= np.abs(lat) > geometry.max_lat
+
+    return on & ~undecided, undecided
+
+
+def make_notification(state: AicraftState, recipient: str, location: str) -> dict:
+    """Create notification for `recipient`, as `state` is heading towards `location`"""
+
+    if state.callsign is None and state.reg is None:
+        # class AicraftState makes sure that icao is not None now
+        state.callsign = state.icao
+
+    # Simply move map to position, if icao is unknown
+    qsa = (
+        f"icao={state.icao}"
+        if state.icao
+        else f"lat={state.pos.lat}&lon={state.pos.lon}"
+    )
+
+    return {
+        "recipient": recipient,
+        "message": Message(
+            location=location,
+            callsign=state.callsign,
+            reg=state.reg,
+            href=f"https://globe.adsbexchange.com/?{qsa}",
+        ),
+    }
+
+
+def find_pairs(
+    states: list[AicraftState], settings: PoiTable, lat: np.ndarray, lon: np.ndarray
+) -> tuple[np.ndarray, np.ndarray]:
+    """Return indices of states, at `lat` and `lon`, and POIs possibly within
+    MAX_DISTANCE, ordered by state, then POI"""
+
+    pairs = [
+        (i, j)
+        for i, state in enumerate(states)
+        for j in settings.index.query(state.pos)
+    ]
+
+    METRICS.inc("pairs_total", len(pairs))
+
+    if not pairs:
+        return np.array([], dtype=int), np.array([], dtype=int)
+
+    i, j = (np.array(x) for x in zip(*pairs))
+
+    # Cheap pre-rejection, so trigonometry is done for candidates only
+    near = in_bounding_box_batch(
+        lat[i],
+        lon[i],
+        settings.lat[j],
+        settings.lon[j],
+        MAX_DISTANCE,
+        lon_limit_batch(lat, MAX_DISTANCE)[i],
+    )
+
+    return i[near], j[near]
+
+
+def find_hits(
+    states: list[AicraftState], settings: PoiTable
+) -> tuple[np.ndarray, np.ndarray]:
+    """Return indices of states and POIs of all notifyable combinations,
+    ordered by state, then POI. Bearing and distance are calculated by
+    `GEOMETRIES[GEOMETRY]`, see `isnotifyable()`."""
+
+    lat = np.array([state.pos.lat for state in states], dtype=float)
+    lon = np.array([state.pos.lon for state in states], dtype=float)
+    track = np.array([state.track for state in states], dtype=float)
+    i, j = find_pairs(states, settings, lat, lon)
+    rad_lat = np.radians(lat)
+    rad_lon = np.radians(lon)
+
+    def calc(geometry: Geometry, k: np.ndarray, m: np.ndarray) -> tuple:
+        return geometry.calc_trig(
+            rad_lat[k],
+            rad_lon[k],
+            settings.rad_lat[m],
+            settings.rad_lon[m],
+            settings.sin_lat[m],
+            settings.cos_lat[m],
+        )
 
+    geometry = GEOMETRIES[GEOMETRY]
+    bearing, dist = calc(geometry, i, j)
 
-def get_notifications(data: list[list], settings: list[dict]) -> list[dict]:
-    """Iterate over adsb data to determine whether HEMS are heading towards
-    user locations by calculating bearing and distance for each combination.
+    if geometry.exact:
+        hits = isnotifyable_course(bearing, track[i], dist)
+    else:
+        # Only pairs too close to call are calculated exactly
+        hits, undecided = isnotifyable_approx_batch(
+            bearing, track[i], dist, lat[i], geometry
+        )
+        bearing, dist = calc(GEOMETRIES["spherical"], i[undecided], j[undecided])
+        hits[undecided] = isnotifyable_course(bearing, track[i[undecided]], dist)
+
+    return i[hits], j[hits]
+
+
+def get_candidates(
+    data: list[list],
+    settings: PoiTable,
+    history: Optional[TrackHistory] = None,
+    now: Optional[float] = None,
+) -> list[tuple[AicraftState, str, str]]:
+    """Return (state, recipient, POI name) of all notifyable combinations.
+    With `history`, tracks are smoothed, or derived where missing."""
+
+    states, rejected = AicraftState.from_states(data, history is None)
+
+    if history is not None:
+        count = len(states)
+        states = history.update(states, now)
+        rejected += count - len(states)
+
+    METRICS.inc("states_total", len(data))
+    METRICS.inc("states_rejected_total", rejected)
+
+    if rejected:
+        logging.debug("InsufficientData: %d state(s) rejected", rejected)
+
+    return [
+        (states[n], recipient, settings.names[m])
+        for n, m in zip(*find_hits(states, settings))
+        for recipient in settings.recipients[m]
+    ]
+
+
+def cooldown_keys(
+    candidates: list[tuple[AicraftState, str, str]],
+) -> list[tuple[str, str, str]]:
+    """Return the (icao, POI, recipient) keys of candidates in a `CooldownStore`"""
+    return [
+        (state.icao or state.callsign or state.reg, location, recipient)
+        for state, recipient, location in candidates
+    ]
+
+
+def filter_cooldown(
+    candidates: list[tuple[AicraftState, str, str]],
+    cooldown: Optional[CooldownStore],
+    now: Optional[float] = None,
+    record: bool = True,
+) -> list[tuple[AicraftState, str, str]]:
+    """Skip candidates notified within the window of `cooldown`, if given.
+    Unless `record` is False, the others are recorded as being notified."""
+
+    if not cooldown:
+        return candidates
+
+    keys = cooldown_keys(candidates)
+    admitted = (cooldown.admit if record else cooldown.check)(keys, now)
+
+    return [c for c, admit in zip(candidates, admitted) if admit]
+
+
+def get_notifications(
+    data: list[list],
+    settings: Union[list[dict], PoiTable],
+    cooldown: Optional[CooldownStore] = None,
+    now: Optional[float] = None,
+    history: Optional[TrackHistory] = None,
+) -> list[dict]:
+    """Determine whether HEMS are heading towards user locations by calculating
+    bearing and distance for each combination of adsb data and POI.
+    POIs out of reach are pruned using a spatial index and bounding boxes, the
+    remaining combinations are evaluated at once, once per unique POI.
+    `settings` are compiled into a `PoiTable`, unless already done by the caller.
+    If `cooldown` is given, combinations notified within its window are skipped.
+    With `history`, tracks are smoothed, or derived where missing.
     Return a list of notifications"""
 
-    # pylint: disable=too-many-nested-blocks
+    if not isinstance(settings, PoiTable):
+        settings = PoiTable(settings, MAX_DISTANCE)
+
+    candidates = filter_cooldown(
+        get_candidates(data, settings, history, now), cooldown, now
+    )
+
+    return [make_notification(*candidate) for candidate in candidates]
+
 
-    notifications = []
+def load_settings(filename: Path, topics: bool = False) -> PoiTable:
+    """Read user settings and compile them into a `PoiTable`, notifying
+    the topic of each POI rather than its recipients, if `topics`, once
+    their subscriptions are confirmed by `sync_topics()`"""
+    with open(filename, "r", encoding="utf-8") as file:
+        return PoiTable(json.load(file), MAX_DISTANCE, topics)
 
-    for state in data:
+
+def sync_topics(filename: Path, settings: PoiTable) -> None:
+    """Subscribe recipients to the topics of their POIs, and unsubscribe
+    them from POIs no longer watched, as far as not done before. Recipients
+    not subscribed (yet) are notified directly rather than by the topic."""
+    with TopicStore(filename) as store:
+        added, removed = sync(store, settings.subscriptions(), firebase().messaging)
+        settings.confirm(store.subscriptions())
+
+    if added or removed:
+        logging.info("Topics: %d subscription(s) added, %d removed", added, removed)
+
+
+def save_hems(adsb: dict, directory: Path, filename: Path) -> None:
+    """Save filtered HEMS data as `directory`/`filename`"""
+    directory.mkdir(parents=True, exist_ok=True)
+
+    with open(directory / Path(filename).name, "w", encoding="utf-8") as file:
+        json.dump(adsb, file, indent=2)
+
+
+def evaluate_file(
+    filename: Path,
+    settings: PoiTable,
+    args: argparse.Namespace,
+    history: Optional[TrackHistory] = None,
+) -> tuple[Optional[float], list[tuple[AicraftState, str, str]]]:
+    """Read an ADS-B data file and determine notification candidates.
+    With `args.adsb`, the file contains the unfiltered response from
+    adsbexchange.com, which is filtered for HEMS first.
+    Return the snapshot time and the candidates."""
+
+    with METRICS.timer("stage_seconds", stage="filter"):
+        with open(filename, "r", encoding="utf-8") as file:
+            adsb = filter_adsb_stream(file) if args.adsb else json.load(file)
+
+    if args.adsb:
+        if args.save_hems:
+            with METRICS.timer("stage_seconds", stage="save_hems"):
+                save_hems(adsb, args.save_hems / Path(filename).parent.name, filename)
+
+    if args.hems_db:
+        with METRICS.timer("stage_seconds", stage="hems_db"):
+            with HemsStore(args.hems_db) as store:
+                store.ingest(adsb)
+
+    if args.no_notify:
+        return adsb.get("time"), []
+
+    with METRICS.timer("stage_seconds", stage="evaluate"):
+        candidates = get_candidates(adsb["states"], settings, history, adsb.get("time"))
+
+    return adsb.get("time"), candidates
+
+
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+def deliver(
+    filename: Path,
+    now: Optional[float],
+    candidates: list[tuple[AicraftState, str, str]],
+    args: argparse.Namespace,
+    dispatcher: Optional[FcmDispatcher] = None,
+    cooldown: Optional[CooldownStore] = None,
+) -> int:
+    """Send (or print) notifications for the candidates of a file,
+    through `dispatcher`, if given, skipping repeated ones, if `cooldown`
+    is given. Only notifications sent successfully are recorded in
+    `cooldown`, so failed ones are not suppressed next time.
+    Return the number of notifications sent."""
+
+    with METRICS.timer("stage_seconds", stage="deliver"):
+        sent = send_notifications(
+            filename,
+            filter_cooldown(candidates, cooldown, now, record=False),
+            args,
+            dispatcher,
+        )
+
+    if cooldown:
+        cooldown.record(cooldown_keys(sent), now)
+
+    return len(sent)
+
+
+def send_notifications(
+    filename: Path,
+    candidates: list[tuple[AicraftState, str, str]],
+    args: argparse.Namespace,
+    dispatcher: Optional[FcmDispatcher] = None,
+) -> list[tuple[AicraftState, str, str]]:
+    """Send (or print) notifications for candidates, see `deliver()`.
+    Return the candidates sent successfully."""
+
+    notifications = [make_notification(*candidate) for candidate in candidates]
+    METRICS.inc("notifications_total", len(notifications))
+
+    if args.stdout:
+        if notifications:
+            print(f"=== {filename} ===\n")
+
+        for notification in notifications:
+            print(f"*** {notification['recipient']} ***")
+            print(notification["message"])
+
+        return candidates
+
+    if dispatcher:
+        sent = dispatcher.dispatch(notifications, args.dry_run)
+    else:
+        sent = fcm_send_batch(notifications, args.dry_run)
+
+    sent = {id(notification) for notification in sent}
+
+    return [c for c, n in zip(candidates, notifications) if id(n) in sent]
+
+
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+def process_file(
+    filename: Path,
+    settings: PoiTable,
+    args: argparse.Namespace,
+    dispatcher: Optional[FcmDispatcher] = None,
+    cooldown: Optional[CooldownStore] = None,
+    history: Optional[TrackHistory] = None,
+) -> int:
+    """Send (or print) notifications for an ADS-B data file, see
+    `evaluate_file()` and `deliver()`, then archive it, so compressing it
+    does not delay notifications. Return the number of notifications."""
+
+    with METRICS.timer("stage_seconds", stage="file"):
+        now, candidates = evaluate_file(filename, settings, args, history)
+        METRICS.inc("files_total")
+
+        notified = (
+            0
+            if args.no_notify
+            else deliver(filename, now, candidates, args, dispatcher, cooldown)
+        )
+
+        if args.archive:
+            archive_file(args.archive, filename)
+
+        return notified
+
+
+def archive_file(root: Path, filename: Path) -> None:
+    """Append a snapshot file to the segment log in `root`, removing it"""
+    with METRICS.timer("stage_seconds", stage="archive"):
+        archive(SegmentLog(root), filename, remove=True)
+
+
+_worker_settings: Optional[PoiTable] = None
+
+
+def init_worker(settings: PoiTable, geometry: str) -> None:
+    """Initialise worker process with the settings parsed by the parent.
+    Workers log to stderr directly, as they run no queue listener."""
+    # pylint: disable=global-statement
+    global _worker_settings, GEOMETRY
+
+    stderr = logging.StreamHandler()
+    stderr.setFormatter(logging.Formatter(LOG_FORMAT))
+    logging.getLogger().handlers = [stderr]
+    logging.getLogger().setLevel(logging.INFO)
+
+    _worker_settings = settings
+    GEOMETRY = geometry
+
+
+def evaluate_job(
+    filename: Path, args: argparse.Namespace
+) -> tuple[Path, Optional[float], list, Optional[str], dict]:
+    """`evaluate_file()` in a worker process. Return the file name, snapshot
+    time, candidates, an error message, if the file could not be read, and
+    the metrics collected, to be merged by the parent."""
+    METRICS.reset()
+
+    try:
+        return (
+            filename,
+            *evaluate_file(filename, _worker_settings, args),
+            None,
+            METRICS.collect(),
+        )
+    except (FileNotFoundError, json.JSONDecodeError) as exception:
+        return filename, None, [], str(exception), METRICS.collect()
+
+
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+def process_files(
+    filenames: list[Path],
+    settings: PoiTable,
+    args: argparse.Namespace,
+    dispatcher: Optional[FcmDispatcher] = None,
+    cooldown: Optional[CooldownStore] = None,
+    jobs: int = 1,
+    history: Optional[TrackHistory] = None,
+) -> int:
+    """Process files, evaluating `jobs` of them in parallel worker processes,
+    which are passed the parsed `settings` once. Notifications are sent (or
+    printed) by this process, in order of snapshot time, so cooldown works as
+    if the files were processed one by one. With `history`, which needs files
+    to be evaluated in order, files are processed one by one.
+    Return the number of notifications."""
+
+    notified = 0
+
+    if jobs <= 1 or len(filenames) <= 1 or history is not None:
+        for filename in filenames:
+            try:
+                notified += process_file(
+                    filename, settings, args, dispatcher, cooldown, history
+                )
+            except (FileNotFoundError, json.JSONDecodeError) as exception:
+                logging.error("'%s': %s", filename, exception)
+
+        return notified
+
+    # Workers are spawned, as forking while logging and FCM threads run is unsafe
+    with ProcessPoolExecutor(
+        max_workers=min(jobs, len(filenames)),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker,
+        initargs=(settings, GEOMETRY),
+    ) as executor:
+        results = list(executor.map(evaluate_job, filenames, [args] * len(filenames)))
+
+    return deliver_results(results, args, dispatcher, cooldown)
+
+
+def deliver_results(
+    results: list[tuple],
+    args: argparse.Namespace,
+    dispatcher: Optional[FcmDispatcher] = None,
+    cooldown: Optional[CooldownStore] = None,
+) -> int:
+    """Send (or print) notifications for the results of `evaluate_job()`,
+    in order of snapshot time, archiving each file once delivered.
+    Return their number."""
+
+    notified = 0
+
+    # Files without time are ordered by name, which contains the time, anyway
+    for filename, now, candidates, error, collected in sorted(
+        results, key=lambda r: (r[1] is None, r[1] or 0, Path(r[0]).name)
+    ):
+        METRICS.merge(collected)
+
+        if error:
+            logging.error("'%s': %s", filename, error)
+            continue
+
+        METRICS.inc("files_total")
+
+        if not args.no_notify:
+            notified += deliver(filename, now, candidates, args, dispatcher, cooldown)
+
+        if args.archive:
+            archive_file(args.archive, filename)
+
+    return notified
+
+
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+def watch(
+    args: argparse.Namespace,
+    filename: Path,
+    stop: Optional[threading.Event] = None,
+    dispatcher: Optional[FcmDispatcher] = None,
+    cooldown: Optional[CooldownStore] = None,
+    history: Optional[TrackHistory] = None,
+    settings: Optional[PoiTable] = None,
+) -> None:
+    """Daemon mode: Process each new file appearing in `args.watch`,
+    until SIGINT/SIGTERM is received or `stop` is set. User settings are
+    re-read whenever `filename` changes, starting with `settings`, if already
+    loaded (and topics confirmed) by the caller. A heartbeat file is written
+    after each poll, so the process can be monitored."""
+
+    if stop is None:
+        stop = threading.Event()
+
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+
+    watcher = SnapshotWatcher(args.watch)
+    mtime = os.stat(filename).st_mtime
+
+    if settings is None:
+        settings = load_settings(filename, args.topics)
+    processed = 0
+    notified = 0
+
+    logging.info("Watching '%s' for new data...", args.watch)
+
+    while not stop.is_set():
         try:
-            state = AicraftState(state)
-
-            for user in settings:
-                recipient, locations = user["recipient"], user["locations"]
-
-                for loc in locations:
-                    location, poi = loc["name"], LatLon(loc["lat"], loc["lon"])
-
-                    if isnotifyable(state, poi):
-                        if state.callsign is None and state.reg is None:
-                            # class AicraftState makes sure that icao is not None now
-                            state.callsign = state.icao
-
-                        # Simply move map to position, if icao is unknown
-                        qsa = (
-                            f"icao={state.icao}"
-                            if state.icao
-                            else f"lat={state.pos.lat}&lon={state.pos.lon}"
-                        )
-
-                        notifications.append(
-                            {
-                                "recipient": recipient,
-                                "message": Message(
-                                    location=location,
-                                    callsign=state.callsign,
-                                    reg=state.reg,
-                                    href=f"https://globe.adsbexchange.com/?{qsa}",
-                                ),
-                            }
-                        )
-        except InsufficientData:
-            logging.debug("InsufficientData: %s", json.dumps(state))
-        except ValueError as exception:
-            logging.error("%s: %s", exception, state)
-
-    return notifications
+            if os.stat(filename).st_mtime != mtime:
+                mtime = os.stat(filename).st_mtime
+                settings = load_settings(filename, args.topics)
+                logging.info("'%s' reloaded.", filename)
 
+                if args.topics and dispatcher and not args.dry_run:
+                    sync_topics(args.topics_db, settings)
+        except (FileNotFoundError, json.JSONDecodeError) as exception:
+            logging.error("'%s': %s", filename, exception)
 
-def main():
-    """Place Chuck Norris joke here..."""
+        snapshots = watcher.poll()
+
+        if snapshots and cooldown:
+            cooldown.evict()
+
+        for snapshot in snapshots:
+            try:
+                notified += process_file(
+                    snapshot, settings, args, dispatcher, cooldown, history
+                )
+                processed += 1
+            except (FileNotFoundError, json.JSONDecodeError) as exception:
+                logging.error("'%s': %s", snapshot, exception)
+
+        if args.heartbeat:
+            write_heartbeat(args.heartbeat, processed=processed, notified=notified)
+
+        if args.metrics:
+            METRICS.write(args.metrics)
+
+        stop.wait(args.interval)
+
+    logging.info("Stopped watching '%s'.", args.watch)
+
+
+def positive_int(value: str) -> int:
+    """Parse a positive integer option"""
+    number = int(value)
+
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, not {number}")
+
+    return number
+
+
+def parse_args() -> tuple[argparse.Namespace, list[str]]:
+    """Parse command line into options and files to be processed"""
 
     parser = argparse.ArgumentParser()
 
     parser.add_argument("-c", "--stdout", action="store_true")
     parser.add_argument("-d", "--debug", action="store_true")
     parser.add_argument("-D", "--dry-run", action="store_true")
+    parser.add_argument("-a", "--adsb", action="store_true")
+    parser.add_argument("--save-hems", type=Path, required=False, default=None)
+    parser.add_argument("--no-notify", action="store_true")
+    parser.add_argument("--hems-db", type=Path, required=False, default=None)
+    parser.add_argument("--archive", type=Path, required=False, default=None)
     parser.add_argument("--fcm-credentials", type=Path, required=False, default=None)
+    parser.add_argument("--fcm-workers", type=positive_int, default=4)
+    parser.add_argument("--fcm-retries", type=int, default=3)
+    parser.add_argument("-j", "--jobs", type=int, default=1)
+    parser.add_argument("--track-history", type=Path, required=False, default=None)
+    parser.add_argument("--geometry", choices=GEOMETRIES, default=GEOMETRY)
+    parser.add_argument("--topics", action="store_true")
+    parser.add_argument(
+        "--topics-db", type=Path, default=Path.home() / "hems-lookout-topics.db"
+    )
+    parser.add_argument("--cooldown", type=float, default=15.0)
+    parser.add_argument(
+        "--cooldown-db", type=Path, default=Path.home() / "hems-lookout-cooldown.db"
+    )
+    parser.add_argument("-w", "--watch", type=Path, required=False, default=None)
+    parser.add_argument("--interval", type=float, default=2.0)
+    parser.add_argument(
+        "--heartbeat", type=Path, default=Path.home() / "hems-lookout.heartbeat"
+    )
+    parser.add_argument("--metrics", type=Path, required=False, default=None)
+    parser.add_argument("--fetch-seconds", type=float, required=False, default=None)
+    parser.add_argument("--profile", action="store_true")
+    parser.add_argument("--profile-top", type=int, default=25)
+    parser.add_argument("--startup-report", action="store_true")
+    parser.add_argument("--startup-budget", type=float, default=STARTUP_BUDGET)
+
+    return parser.parse_known_args()
+
+
+def write_metrics(args: argparse.Namespace) -> None:
+    """Write metrics to `args.metrics`, if given. Unless watching, this is a
+    single run of query-adsb.sh, whose duration includes fetching the data,
+    which took `args.fetch_seconds`."""
+
+    if not args.metrics:
+        return
+
+    if not args.watch:
+        fetch = args.fetch_seconds or 0.0
+
+        if args.fetch_seconds is not None:
+            METRICS.observe("stage_seconds", fetch, stage="fetch")
+
+        METRICS.set("run_seconds", uptime() + fetch)
+
+    METRICS.set("last_run_timestamp_seconds", time.time())
+    METRICS.write(args.metrics)
+
+
+def main():
+    """Place Chuck Norris joke here..."""
+    # pylint: disable=global-statement
+    global GEOMETRY
 
-    args, leftover = parser.parse_known_args()
+    # Spawned `--jobs` workers of the frozen executable must not run main()
+    multiprocessing.freeze_support()
+
+    args, leftover = parse_args()
+    GEOMETRY = args.geometry
+
+    listeners = setup_logging()
 
     if args.debug:
         logging.getLogger().setLevel(logging.DEBUG)
 
+    try:
+        if args.profile:
+            run_profiled(args, leftover)
+        else:
+            run(args, leftover)
+    finally:
+        # Write records still queued
+        for listener in listeners:
+            listener.stop()
+
+
+def run_profiled(args: argparse.Namespace, leftover: list[str]) -> None:
+    """`run()` with cProfile and tracemalloc, see `profiling.py`"""
+
+    # Imported only when needed, as pstats takes some time
+    from profiling import profile  # pylint: disable=import-outside-toplevel
+
+    with profile(Path.home(), "hems-lookout-profile", args.profile_top) as filename:
+        run(args, leftover)
+
+    logging.info("Profile written to '%s'", filename)
+
+
+def run(args: argparse.Namespace, leftover: list[str]) -> None:
+    """Process files given, then watch for new ones, if requested"""
+
+    startup = StartupTimer()
+
     try:
         homedir = Path(os.getenv("HOME", os.getenv("USERPROFILE")))
         filename = homedir / "hems-lookout-users.json"
+        settings = load_settings(filename, args.topics)
+        startup.lap("settings")
 
-        with open(filename, "r", encoding="utf-8") as file:
-            settings = json.load(file)
-
-        if not args.stdout:
+        if args.stdout or args.no_notify:
+            dispatcher = None
+        else:
             filename = (
                 args.fcm_credentials
                 if args.fcm_credentials
@@ -233,26 +1197,51 @@ def main():
             )
 
             fcm_init(filename)
+            dispatcher = FcmDispatcher(args.fcm_workers, args.fcm_retries)
+            startup.lap("firebase")
+
+            if args.topics and not args.dry_run:
+                sync_topics(args.topics_db, settings)
+                startup.lap("topics")
+
+        # Only remember notifications actually being sent
+        if args.stdout or args.no_notify or args.dry_run or args.cooldown <= 0:
+            cooldown = None
+        else:
+            cooldown = CooldownStore(args.cooldown_db, args.cooldown * 60.0)
+            cooldown.evict()
+            startup.lap("cooldown")
+
+        # Tracks are only needed, and the history only updated, when notifying
+        history = (
+            TrackHistory.load(args.track_history)
+            if args.track_history and not args.no_notify
+            else None
+        )
 
-        for filename in leftover:
-            with open(filename, "r", encoding="utf-8") as file:
-                adsb = json.load(file)
-                notifications = get_notifications(adsb["states"], settings)
+        startup.check(args.startup_budget, args.startup_report)
 
-                if args.stdout:
-                    if notifications:
-                        print(f"=== {filename} ===\n")
+        process_files(
+            leftover, settings, args, dispatcher, cooldown, args.jobs, history
+        )
 
-                    for notification in notifications:
-                        print(f"*** {notification['recipient']} ***")
-                        print(notification["message"])
-                else:
-                    for notification in notifications:
-                        fcm_send(
-                            notification["recipient"],
-                            notification["message"],
-                            args.dry_run,
-                        )
+        if args.watch:
+            filename = homedir / "hems-lookout-users.json"
+            watch(args, filename, None, dispatcher, cooldown, history, settings)
+
+        if history is not None:
+            history.save(args.track_history)
+
+        write_metrics(args)
+
+        if cooldown:
+            cooldown.close()
+
+        if dispatcher:
+            dispatcher.close()
+
+            if args.watch:
+                fcm_terminate()
 
     except FileNotFoundError as exception:
         logging.error("'%s': %s", filename, exception)
@@ -268,16 +1257,56 @@ class FoldLinesFormatter(logging.Formatter):
         return super().format(record).replace("\n", " ")
 
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s %(filename)s(%(lineno)d): %(message)s",
-)
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue records without ever blocking, dropping them if the queue is full"""
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            METRICS.inc("log_dropped_total", logger=record.name)
+
+
+def queued(
+    logger: logging.Logger, handler: logging.Handler
+) -> logging.handlers.QueueListener:
+    """Make `logger` hand its records to a bounded queue, from which they are
+    written to `handler` by a separate thread. Return the started listener."""
+
+    records = queue.Queue(LOG_QUEUE_SIZE)
+    logger.addHandler(DroppingQueueHandler(records))
+
+    listener = logging.handlers.QueueListener(
+        records, handler, respect_handler_level=True
+    )
+    listener.start()
+
+    return listener
+
+
+def setup_logging() -> list[logging.handlers.QueueListener]:
+    """Log to stderr, and FCM results to $HOME/hems-lookout.log, which is
+    rotated at LOG_MAX_BYTES. Records are written by separate threads, so
+    log I/O never delays sending notifications. Return the listeners, to be
+    stopped, writing records still queued, before exiting."""
+
+    stderr = logging.StreamHandler()
+    stderr.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    logfile = logging.handlers.RotatingFileHandler(
+        Path.home() / "hems-lookout.log",
+        maxBytes=LOG_MAX_BYTES,
+        backupCount=LOG_BACKUPS,
+    )
+    logfile.setFormatter(FoldLinesFormatter(fmt="%(asctime)s %(message)s"))
+
+    logging.getLogger().setLevel(logging.INFO)
+
+    return [queued(logging.getLogger(), stderr), queued(fcmlog, logfile)]
 
-handler = logging.FileHandler(Path.home() / "hems-lookout.log")
-handler.setFormatter(FoldLinesFormatter(fmt="%(asctime)s %(message)s"))
 
 fcmlog = logging.getLogger("fcmlog")
-fcmlog.addHandler(handler)
+fcmlog_lock = threading.Lock()
 fcmlog.setLevel(logging.DEBUG)
 fcmlog.propagate = False
 
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+"""Compiled POI table and spatial index over POIs,
+so only POIs near an aircraft need to be checked"""
+
+# pylint: disable=invalid-name
+
+import hashlib
+import math
+from collections import defaultdict
+import numpy as np
+from gcmath import LatLon, km_to_rad, unit_vector
+
+# Recipients starting with this are FCM topics, rather than tokens
+TOPIC_PREFIX = "/topics/"
+
+
+def topic_name(name: str, lat: float, lon: float) -> str:
+    """Return the FCM topic of a POI, which must match [a-zA-Z0-9-_.~%]+"""
+    digest = hashlib.sha1(f"{name}|{lat!r}|{lon!r}".encode("utf-8")).hexdigest()
+
+    return f"poi-{digest[:20]}"
+
+
+class PoiIndex:
+    """Uniform grid over the POIs' unit sphere vectors.
+
+    Cells are cubes with an edge of the chord length matching `radius`,
+    so any POI within `radius` of a position is found in the 3×3×3 cells
+    around it. Other than a latitude/longitude grid, this does not need
+    special handling for the poles or the antimeridian.
+    """
+
+    def __init__(self, pois: list[LatLon], radius: float):
+        # Add some slack, so rounding never drops a POI right at the border
+        self.cell = 2.0 * math.sin(min(km_to_rad(radius), math.pi) / 2.0)
+        self.cell = self.cell * (1.0 + 1e-9) + 1e-12
+        self.cells = defaultdict(list)
+
+        for i, poi in enumerate(pois):
+            self.cells[self._key(poi)].append(i)
+
+    def __len__(self) -> int:
+        return sum(len(cell) for cell in self.cells.values())
+
+    def _key(self, pos: LatLon) -> tuple[int, int, int]:
+        return tuple(math.floor(v / self.cell) for v in unit_vector(pos))
+
+    def query(self, pos: LatLon) -> list[int]:
+        """Return sorted indices of all POIs possibly within `radius` of `pos`.
+        This is a superset, so distance must still be checked by the caller."""
+        x, y, z = self._key(pos)
+
+        candidates = []
+
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                for dz in (-1, 0, 1):
+                    cell = self.cells.get((x + dx, y + dy, z + dz))
+
+                    if cell:
+                        candidates.extend(cell)
+
+        return sorted(candidates)
+
+
+class PoiTable:
+    """User settings compiled into a table of unique POIs.
+
+    POIs shared by several recipients (same name and coordinates) are stored
+    only once, along with their precomputed radians and sine/cosine of the
+    latitude, so geometry needs to be calculated once per unique POI.
+    `subscribers[i]` lists all recipients watching POI `i`, `topics[i]` is
+    its FCM topic. `recipients[i]` lists the recipients to notify, which are
+    the subscribers, or, with `topics`, the topic for those `confirm()`ed to
+    be subscribed, and the others directly.
+    """
+
+    # pylint: disable=too-few-public-methods,too-many-instance-attributes
+
+    def __init__(self, settings: list[dict], radius: float, topics: bool = False):
+        pois = {}
+
+        for user in settings:
+            for loc in user["locations"]:
+                recipients = pois.setdefault((loc["name"], loc["lat"], loc["lon"]), [])
+
+                if user["recipient"] not in recipients:
+                    recipients.append(user["recipient"])
+
+        self.names = [name for name, _, _ in pois]
+        self.topics = [topic_name(*poi) for poi in pois]
+        self.subscribers = list(pois.values())
+        self.recipients = self.subscribers
+        self.use_topics = topics
+
+        self.lat = np.array([lat for _, lat, _ in pois], dtype=float)
+        self.lon = np.array([lon for _, _, lon in pois], dtype=float)
+        self.rad_lat = np.radians(self.lat)
+        self.rad_lon = np.radians(self.lon)
+        self.sin_lat = np.sin(self.rad_lat)
+        self.cos_lat = np.cos(self.rad_lat)
+
+        self.index = PoiIndex(
+            [LatLon(lat, lon) for _, lat, lon in pois],
+            radius,
+        )
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def subscriptions(self) -> dict[str, set[str]]:
+        """Return the recipients to be subscribed to each topic"""
+        return dict(zip(self.topics, (set(s) for s in self.subscribers)))
+
+    def confirm(self, subscriptions: dict[str, set[str]]) -> None:
+        """With `topics`, notify subscribers of a POI by its topic, as far as
+        `subscriptions` confirm them being subscribed, the others directly"""
+        if not self.use_topics:
+            return
+
+        self.recipients = []
+
+        for topic, subscribers in zip(self.topics, self.subscribers):
+            confirmed = subscriptions.get(topic, set())
+            direct = [s for s in subscribers if s not in confirmed]
+
+            self.recipients.append(
+                ([TOPIC_PREFIX + topic] if len(direct) < len(subscribers) else [])
+                + direct
+            )
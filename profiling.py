@@ -0,0 +1,103 @@
+"""Built-in profiling of a whole run, as external tools are not available on
+the production host, and `notify.spec` builds with `optimize=2`"""
+
+import cProfile
+import io
+import pstats
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, Optional
+
+INTERVAL = 0.05  # s between samples of traced memory
+
+
+class PeakSampler(threading.Thread):
+    """Sample traced memory, keeping a snapshot taken closest to its peak.
+
+    `tracemalloc` only reports the size of the peak, not where it was
+    allocated, so a snapshot is taken whenever memory grows by more than
+    `growth` beyond the largest snapshot so far.
+    """
+
+    def __init__(self, interval: float = INTERVAL, growth: float = 0.1):
+        super().__init__(name="tracemalloc", daemon=True)
+        self.interval = interval
+        self.growth = growth
+        self.stopped = threading.Event()
+        self.size = 0
+        self.snapshot: Optional[tracemalloc.Snapshot] = None
+
+    def sample(self) -> None:
+        """Take a snapshot, if memory has grown enough since the last one"""
+        current, _ = tracemalloc.get_traced_memory()
+
+        if self.snapshot is None or current > self.size * (1.0 + self.growth):
+            self.snapshot = tracemalloc.take_snapshot()
+            self.size = current
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval):
+            self.sample()
+
+    def stop(self) -> None:
+        """Stop sampling, taking a final sample"""
+        self.stopped.set()
+        self.join()
+        self.sample()
+
+
+def report(
+    profiler: cProfile.Profile, sampler: PeakSampler, peak: int, top: int
+) -> str:
+    """Return top `top` functions by cumulative time and allocation sites
+    of the snapshot closest to the peak of traced memory as text"""
+
+    text = io.StringIO()
+    stats = pstats.Stats(profiler, stream=text)
+    stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(top)
+
+    text.write(
+        f"Peak traced memory {peak / 1024:.1f} KiB, "
+        f"top {top} allocation sites at {sampler.size / 1024:.1f} KiB:\n\n"
+    )
+
+    if sampler.snapshot is not None:
+        snapshot = sampler.snapshot.filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+
+        for stat in snapshot.statistics("lineno")[:top]:
+            text.write(f"{stat}\n")
+
+    return text.getvalue()
+
+
+@contextmanager
+def profile(directory: Path, name: str, top: int = 25) -> Iterator[Path]:
+    """Profile the `with` block with cProfile and tracemalloc. Write the
+    cProfile data to `directory/<name>-<time>.prof`, to be inspected by
+    `python -m pstats`, and a summary of the top `top` functions and
+    allocation sites to `directory/<name>-<time>.txt`. Yield the latter."""
+
+    stamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    filename = Path(directory) / f"{name}-{stamp}.txt"
+
+    tracemalloc.start()
+    sampler = PeakSampler()
+    sampler.start()
+    profiler = cProfile.Profile()
+    profiler.enable()
+
+    try:
+        yield filename
+    finally:
+        profiler.disable()
+        sampler.stop()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        profiler.dump_stats(filename.with_suffix(".prof"))
+        filename.write_text(report(profiler, sampler, peak, top), encoding="utf-8")
@@ -23,52 +23,43 @@ readonly HEMS="$SCRIPTDIR/data/hems"
 
 # Pull json data and store in folders by date
 [ -d "$ADSB/$d" ] || mkdir -p "$ADSB/$d"
-[ -d "$HEMS/$d" ] || mkdir -p "$HEMS/$d"
 
-curl -sS https://adsbexchange-com1.p.rapidapi.com/v2/lat/$lat/lon/$lon/dist/$radius/ \
+fetch=$(curl -sS https://adsbexchange-com1.p.rapidapi.com/v2/lat/$lat/lon/$lon/dist/$radius/ \
 	--header "X-RapidAPI-Host: adsbexchange-com1.p.rapidapi.com" \
 	--header "X-RapidAPI-Key: $RAPIDAPI_KEY_ADSBEXCHANGE" \
-	> "$ADSB/${d}/${d}_${t}.json"
+	--output "$ADSB/${d}/${d}_${t}.json" --write-out '%{time_total}')
 
-# Filter HEMS by squawk 0020/0034 and regex.
-# For compatibility, prepend format description
-regex="^(AIRESC|C|CH(R|XE?)|DOC|DRAGO|KR|LAS|LIFELN|MEDIC|NHX|RESQ|RGA|RK|SA(MU|REX))[0-9]+[A-Z]* *"
+# Metrics of the whole run, including the fetch above, unless the daemon
+# writes its own
+metrics=()
+if [ -n "${HEMS_LOOKOUT_METRICS:-}" ] && [ -z "${HEMS_LOOKOUT_DAEMON:-}" ]; then
+	metrics=(--metrics "$HEMS_LOOKOUT_METRICS" --fetch-seconds "$fetch")
+fi
+
+# Filter HEMS by squawk 0020/0034 and callsign regex, save result to data/hems,
+# then send notifications, unless `notify --watch` is running as daemon and
+# picks up the filtered file itself. Filtered states are also stored in
+# data/hems.db, see hemsdb.py. The original JSON is compressed and
+# appended to the day's segment log in data/adsb, see segments.py. Recent
+# positions per aircraft are kept in data/hems.tracks.json, see tracks.py
+if [ -x "$SCRIPTDIR/dist/notify-onedir/notify" ]; then
+	notify="$SCRIPTDIR/dist/notify-onedir/notify"
+else
+	notify="$SCRIPTDIR/dist/notify"
+fi
 
-jq '{
-"time": '$(date +%s)',
-"desc": [
-	"icao24",
-	"callsign",
-	"reg",
-	"squawk",
-	"lat",
-	"lon",
-	"alt(baro)[ft]",
-	"vrate(baro)[ft/min]",
-	"track[deg]",
-	"groundspeed[kts]"
-],
-"states": [
-	.ac[] |
-	select((.squawk == ("0020", "0034")) or
-			(.flight // "" | match("'"$regex"'"))) |
-			[
-				.hex,
-				.flight,
-				.r,
-				.squawk,
-				.lat,
-				.lon,
-				.alt_baro,
-				.baro_rate,
-				.track,
-				.gs
-			]
-] | unique
-}' "$ADSB/${d}/${d}_${t}.json" \
->  "$HEMS/${d}/${d}_${t}.json"
+snapshot="$ADSB/${d}/${d}_${t}.json"
+status=0
 
-"$SCRIPTDIR/dist/notify" "$HEMS/${d}/${d}_${t}.json"
+"$notify" --adsb --save-hems "$HEMS" --hems-db "$HEMS.db" --archive "$ADSB" \
+	--track-history "$HEMS.tracks.json" ${HEMS_LOOKOUT_DAEMON:+--no-notify} \
+	${metrics[@]+"${metrics[@]}"} \
+	"$snapshot" || status=$?
+
+# notify bails out before archiving, if it cannot read the user settings, or
+# fails otherwise, so archive what it left behind
+if [ -f "$snapshot" ]; then
+	python3 "$SCRIPTDIR/segments.py" "$ADSB" append --remove "$snapshot"
+fi
 
-# Compress original JSON
-xz -z9 "$ADSB/${d}/${d}_${t}.json"
+exit $status
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+
+"""Replay archived ADS-B data from `data/adsb/<date>/<date>_<time>.json.xz`
+or the segment log in `data/adsb`, see `segments.py`,
+through HEMS filter and notification detection, without sending anything.
+Days are processed in parallel. Results are aggregated per POI and recipient,
+so changes of TRACK_DEVIATION or MAX_DISTANCE can be evaluated.
+"""
+
+import argparse
+import functools
+import json
+import logging
+import lzma
+import os
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterator, Optional, TextIO
+import notify
+from cooldown import CooldownStore
+from hemsfilter import filter_adsb_stream
+from segments import SegmentLog, snapshot_time
+
+_settings: Optional[notify.PoiTable] = None
+_cooldown: float = 0.0
+
+
+def init(
+    settings: list[dict],
+    track_deviation: Optional[float] = None,
+    max_distance: Optional[float] = None,
+    cooldown: float = 0.0,
+) -> None:
+    """Initialise (worker) process with parameters to be evaluated"""
+    # pylint: disable=global-statement
+    global _settings, _cooldown
+
+    if track_deviation is not None:
+        notify.TRACK_DEVIATION = track_deviation
+
+    if max_distance is not None:
+        notify.MAX_DISTANCE = max_distance
+
+    _settings = notify.PoiTable(settings, notify.MAX_DISTANCE)
+    _cooldown = cooldown
+
+
+def open_snapshot(filename: Path):
+    """Open (xz compressed) JSON file as text"""
+    if filename.suffix == ".xz":
+        return lzma.open(filename, "rt", encoding="utf-8")
+
+    return open(filename, "r", encoding="utf-8")
+
+
+def iter_snapshots(day: Path) -> Iterator[tuple[str, Callable[[], TextIO]]]:
+    """Yield name and opener of all snapshots of a day, from `<date>/` files,
+    then from the segment log, skipping snapshots contained in both"""
+    files = sorted(day.glob("*.json.xz")) + sorted(day.glob("*.json"))
+    times = set()
+
+    for filename in sorted(files, key=lambda f: f.name):
+        times.add(snapshot_time(filename))
+        yield str(filename), functools.partial(open_snapshot, filename)
+
+    log = SegmentLog(day.parent)
+
+    for timestamp, offset, length in log.index(day.name):
+        if timestamp not in times:
+            yield f"{log.segment(day.name)}@{timestamp}", functools.partial(
+                log.open, day.name, offset, length
+            )
+
+
+def replay_day(day: Path) -> dict:
+    """Replay all snapshots of a day. Return counts of snapshots, errors and
+    notifications and aircraft per (POI, recipient)."""
+
+    result = {
+        "snapshots": 0,
+        "errors": 0,
+        "notifications": Counter(),
+        "aircraft": defaultdict(set),
+    }
+
+    cooldown = CooldownStore(":memory:", _cooldown * 60.0) if _cooldown else None
+    for filename, opener in iter_snapshots(day):
+        try:
+            with opener() as file:
+                adsb = filter_adsb_stream(file)
+        except (OSError, EOFError, lzma.LZMAError, json.JSONDecodeError) as exception:
+            logging.error("'%s': %s", filename, exception)
+            result["errors"] += 1
+            continue
+
+        result["snapshots"] += 1
+
+        for notification in notify.get_notifications(
+            adsb["states"], _settings, cooldown, adsb["time"]
+        ):
+            message = notification["message"]
+            key = (message.location, notification["recipient"])
+            result["notifications"][key] += 1
+            result["aircraft"][key].add(message.reg or message.callsign)
+
+    if cooldown:
+        cooldown.close()
+
+    return result
+
+
+# pylint: disable-next=too-many-arguments,too-many-positional-arguments
+def replay(
+    days: list[Path],
+    settings: list[dict],
+    jobs: int = 1,
+    track_deviation: Optional[float] = None,
+    max_distance: Optional[float] = None,
+    cooldown: float = 0.0,
+) -> dict:
+    """Replay days, `jobs` in parallel, with the parameters given, which
+    default to the ones from `notify`. Return the aggregated result."""
+
+    initargs = (settings, track_deviation, max_distance, cooldown)
+    total = {
+        "days": len(days),
+        "snapshots": 0,
+        "errors": 0,
+        "notifications": Counter(),
+        "aircraft": defaultdict(set),
+    }
+
+    if jobs > 1:
+        executor = ProcessPoolExecutor(
+            max_workers=jobs, initializer=init, initargs=initargs
+        )
+        results = executor.map(replay_day, days)
+    else:
+        executor = None
+        init(*initargs)
+        results = map(replay_day, days)
+
+    for result in results:
+        total["snapshots"] += result["snapshots"]
+        total["errors"] += result["errors"]
+        total["notifications"].update(result["notifications"])
+
+        for key, aircraft in result["aircraft"].items():
+            total["aircraft"][key] |= aircraft
+
+    if executor:
+        executor.shutdown()
+
+    return total
+
+
+def main():
+    """Replay archived days given on the command line"""
+
+    parser = argparse.ArgumentParser(description=__doc__)
+
+    parser.add_argument("days", type=Path, nargs="+", help="data/adsb/<date>")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count())
+    parser.add_argument("-u", "--users", type=Path, default=None)
+    parser.add_argument("--track-deviation", type=float, default=None)
+    parser.add_argument("--max-distance", type=float, default=None)
+    parser.add_argument("--cooldown", type=float, default=0.0)
+    parser.add_argument("--json", action="store_true")
+
+    args = parser.parse_args()
+
+    users = args.users or Path.home() / "hems-lookout-users.json"
+
+    with open(users, "r", encoding="utf-8") as file:
+        settings = json.load(file)
+
+    track_deviation = (
+        notify.TRACK_DEVIATION if args.track_deviation is None else args.track_deviation
+    )
+    max_distance = (
+        notify.MAX_DISTANCE if args.max_distance is None else args.max_distance
+    )
+
+    total = replay(
+        sorted(args.days),
+        settings,
+        args.jobs,
+        track_deviation,
+        max_distance,
+        args.cooldown,
+    )
+    rows = [
+        {
+            "poi": poi,
+            "recipient": recipient,
+            "notifications": count,
+            "aircraft": len(total["aircraft"][(poi, recipient)]),
+        }
+        for (poi, recipient), count in sorted(total["notifications"].items())
+    ]
+
+    if args.json:
+        print(
+            json.dumps(
+                {
+                    "track_deviation": track_deviation,
+                    "max_distance": max_distance,
+                    "days": total["days"],
+                    "snapshots": total["snapshots"],
+                    "errors": total["errors"],
+                    "results": rows,
+                },
+                indent=4,
+            )
+        )
+    else:
+        print(
+            f"{total['days']} day(s), {total['snapshots']} snapshot(s), "
+            f"{total['errors']} error(s), TRACK_DEVIATION={track_deviation}, "
+            f"MAX_DISTANCE={max_distance}\n"
+        )
+
+        for row in rows:
+            print(
+                f"{row['notifications']:8} {row['aircraft']:4} "
+                f"{row['poi']} {row['recipient']}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+
+"""Append-only log of compressed ADS-B snapshots, one segment per day.
+
+Each snapshot is compressed into an independent xz stream, which is appended
+to `<root>/<date>.seg.xz`, so the segment as a whole is still a valid xz file.
+Snapshot time, offset and length of each stream are appended to
+`<root>/<date>.idx`, one line per snapshot, for random access.
+"""
+
+import argparse
+import bisect
+import io
+import lzma
+import os
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Iterator, Optional, TextIO
+
+SEGMENT = ".seg.xz"
+INDEX = ".idx"
+
+# Snapshots are named <date>_<time>.json[.xz] by query-adsb.sh
+NAME = re.compile(r"^(\d{4}-\d{2}-\d{2})_(\d{2})-(\d{2})(-\d{2})?\.json(\.xz)?$")
+
+
+def snapshot_time(filename: Path) -> int:
+    """Return the (local) time a snapshot was taken, as encoded in its name,
+    else its modification time"""
+    match = NAME.match(Path(filename).name)
+
+    if not match:
+        return int(os.stat(filename).st_mtime)
+
+    seconds = match.group(4) or "-00"
+
+    return int(
+        time.mktime(
+            time.strptime(
+                f"{match.group(1)} {match.group(2)}:{match.group(3)}:{seconds[1:]}",
+                "%Y-%m-%d %H:%M:%S",
+            )
+        )
+    )
+
+
+def snapshot_day(timestamp: int) -> str:
+    """Return the (local) date of `timestamp`, naming its segment"""
+    return time.strftime("%Y-%m-%d", time.localtime(timestamp))
+
+
+class SegmentLog:
+    """Per-day segments of compressed snapshots in `root`, see above"""
+
+    def __init__(self, root: Path, preset: int = 6):
+        self.root = Path(root)
+        self.preset = preset
+
+    def segment(self, day: str) -> Path:
+        """Return the segment file of `day`"""
+        return self.root / f"{day}{SEGMENT}"
+
+    def days(self) -> list[str]:
+        """Return all days having an index, in order"""
+        return sorted(path.name[: -len(INDEX)] for path in self.root.glob(f"*{INDEX}"))
+
+    def index(self, day: str) -> list[tuple[int, int, int]]:
+        """Return (time, offset, length) of all snapshots of `day`, by time"""
+        try:
+            with open(self.root / f"{day}{INDEX}", "r", encoding="ascii") as file:
+                entries = [tuple(int(v) for v in line.split()) for line in file]
+        except FileNotFoundError:
+            return []
+
+        # An incomplete last line is left by an interrupted append
+        return sorted(entry for entry in entries if len(entry) == 3)
+
+    def append(
+        self, data: bytes, timestamp: int, compressed: bool = False
+    ) -> tuple[int, int]:
+        """Append snapshot `data`, taken at `timestamp`, to the segment of its
+        day. `compressed` data must be a complete xz stream already.
+        Return offset and length within the segment."""
+        stream = data if compressed else lzma.compress(data, preset=self.preset)
+        day = snapshot_day(timestamp)
+
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        # Data goes first, so the index never refers to anything incomplete
+        with open(self.segment(day), "ab") as file:
+            offset = os.fstat(file.fileno()).st_size
+            file.write(stream)
+            file.flush()
+            os.fsync(file.fileno())
+
+        with open(self.root / f"{day}{INDEX}", "a", encoding="ascii") as file:
+            file.write(f"{timestamp} {offset} {len(stream)}\n")
+
+        return offset, len(stream)
+
+    def read(self, day: str, offset: int, length: int) -> bytes:
+        """Return the compressed stream at `offset` of the segment of `day`"""
+        with open(self.segment(day), "rb") as file:
+            file.seek(offset)
+            stream = file.read(length)
+
+        if len(stream) != length:
+            raise EOFError(f"{self.segment(day)}: Truncated at {offset}")
+
+        return stream
+
+    def open(self, day: str, offset: int, length: int) -> TextIO:
+        """Open a snapshot as text, decompressing it while being read"""
+        return io.TextIOWrapper(
+            lzma.LZMAFile(io.BytesIO(self.read(day, offset, length))),
+            encoding="utf-8",
+        )
+
+    def find(self, timestamp: int) -> Optional[tuple[str, int, int, int]]:
+        """Return (day, time, offset, length) of the latest snapshot taken
+        at or before `timestamp` on the same day, if any"""
+        day = snapshot_day(timestamp)
+        index = self.index(day)
+        i = bisect.bisect_right(index, (timestamp, sys.maxsize, sys.maxsize))
+
+        return (day, *index[i - 1]) if i else None
+
+    def get(self, timestamp: int) -> bytes:
+        """Return the decompressed snapshot taken at `timestamp`"""
+        day = snapshot_day(timestamp)
+
+        for when, offset, length in self.index(day):
+            if when == timestamp:
+                return lzma.decompress(self.read(day, offset, length))
+
+        raise KeyError(timestamp)
+
+    def snapshots(self, day: str) -> Iterator[tuple[int, bytes]]:
+        """Yield time and decompressed data of all snapshots of `day`"""
+        for timestamp, offset, length in self.index(day):
+            yield timestamp, lzma.decompress(self.read(day, offset, length))
+
+
+def archive(log: SegmentLog, filename: Path, remove: bool = False) -> None:
+    """Append a (xz compressed) snapshot file to `log`, optionally removing it,
+    and its directory, once empty. Compressed files are appended as they are."""
+    filename = Path(filename)
+
+    with open(filename, "rb") as file:
+        log.append(file.read(), snapshot_time(filename), filename.suffix == ".xz")
+
+    if remove:
+        filename.unlink()
+
+        try:
+            filename.parent.rmdir()
+        except OSError:
+            pass
+
+
+def convert(log: SegmentLog, remove: bool = False) -> int:
+    """Convert `<root>/<date>/*.json[.xz]` archives into segments.
+    Snapshots already contained are skipped, so this may be resumed.
+    Return the number of snapshots appended."""
+    count = 0
+
+    for day in sorted(path for path in log.root.iterdir() if path.is_dir()):
+        files = [path for path in day.iterdir() if NAME.match(path.name)]
+        contained = {timestamp for timestamp, _, _ in log.index(day.name)}
+
+        for filename in sorted(files, key=lambda f: f.name):
+            if snapshot_time(filename) in contained:
+                if remove:
+                    filename.unlink()
+                continue
+
+            archive(log, filename, remove)
+            count += 1
+
+        if remove:
+            try:
+                day.rmdir()
+            except OSError:
+                pass
+
+    return count
+
+
+def main() -> int:
+    """Append, convert, list or extract snapshots"""
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("root", type=Path, help="data/adsb")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("append", help="append snapshot files")
+    command.add_argument("files", type=Path, nargs="+")
+    command.add_argument("--remove", action="store_true")
+    command.add_argument("--preset", type=int, default=6)
+
+    command = commands.add_parser("convert", help="convert <date>/ directories")
+    command.add_argument("--remove", action="store_true")
+
+    command = commands.add_parser("list", help="list snapshots")
+    command.add_argument("days", nargs="*")
+
+    command = commands.add_parser("cat", help="write snapshot to stdout")
+    command.add_argument("time", type=int)
+
+    args = parser.parse_args()
+    log = SegmentLog(args.root, getattr(args, "preset", 6))
+
+    if args.command == "append":
+        for filename in args.files:
+            archive(log, filename, args.remove)
+    elif args.command == "convert":
+        print(f"{convert(log, args.remove)} snapshot(s) converted")
+    elif args.command == "list":
+        for day in args.days or log.days():
+            for timestamp, offset, length in log.index(day):
+                print(f"{day} {timestamp} {offset} {length}")
+    else:
+        try:
+            sys.stdout.buffer.write(log.get(args.time))
+        except KeyError:
+            print(f"No snapshot at {args.time}", file=sys.stderr)
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
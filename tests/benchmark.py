@@ -0,0 +1,301 @@
+"""Benchmark great circle math and the notification pipeline on synthetic
+fleets and POIs, offline, using `MockFirebaseAdmin` instead of FCM.
+
+Run from the repository root:
+
+    python -m tests.benchmark --save baseline.json
+    python -m tests.benchmark --compare baseline.json
+
+Results are latencies (best of `--repeat` runs) and throughput per function
+and pipeline stage. With `--compare`, latencies exceeding the baseline by more
+than `--tolerance` are reported as regressions, and the exit code is 1.
+"""
+
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable
+import firebase_admin
+import numpy as np
+import notify
+from gcmath import (
+    LatLon,
+    calc_bearing,
+    calc_bearing_batch,
+    calc_distance,
+    calc_distance_batch,
+    travel,
+    travel_batch,
+)
+from tests.test_notify import MockFirebaseAdmin
+
+FLEETS = [10, 100, 1000, 10000]
+POIS = [10, 1000, 100000]
+MAX_PAIRS = 1e8
+
+# Germany, roughly
+LAT = (47.3, 55.0)
+LON = (5.9, 15.0)
+
+
+def random_states(count: int, rnd: random.Random) -> list[list]:
+    """Create `count` aircraft states, as found in data/hems/**.json"""
+    return [
+        [
+            f"{i:06x}",
+            f"CHX{i}",
+            f"D-H{i:03}",
+            "0020",
+            rnd.uniform(*LAT),
+            rnd.uniform(*LON),
+            1100,
+            0,
+            rnd.uniform(0.0, 360.0),
+            100,
+        ]
+        for i in range(count)
+    ]
+
+
+def random_settings(count: int, rnd: random.Random, per_user: int = 3) -> list[dict]:
+    """Create user settings with `count` POIs in total"""
+    return [
+        {
+            "recipient": f"token{u}",
+            "locations": [
+                {
+                    "name": f"POI {u}/{n}",
+                    "lat": rnd.uniform(*LAT),
+                    "lon": rnd.uniform(*LON),
+                }
+                for n in range(min(per_user, count - u * per_user))
+            ],
+        }
+        for u in range(-(-count // per_user))
+    ]
+
+
+def measure(func: Callable, repeat: int) -> float:
+    """Return best time of `repeat` calls of `func`"""
+    best = float("inf")
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+
+    return best
+
+
+def record(results: dict, name: str, latency: float, count: int, unit: str) -> None:
+    """Store and print latency and throughput"""
+    results[name] = {
+        "latency": latency,
+        "throughput": count / latency if latency else float("inf"),
+        "unit": unit,
+    }
+    print(
+        f"{name:48} {latency * 1000.0:12.3f} ms {results[name]['throughput']:14.0f} {unit}",
+        flush=True,
+    )
+
+
+def bench_gcmath(results: dict, count: int, repeat: int, rnd: random.Random) -> None:
+    """Scalar and vectorised great circle functions on `count` pairs"""
+    src = [LatLon(rnd.uniform(*LAT), rnd.uniform(*LON)) for _ in range(count)]
+    dst = [LatLon(rnd.uniform(*LAT), rnd.uniform(*LON)) for _ in range(count)]
+    arrays = [
+        np.array([p.lat for p in src]),
+        np.array([p.lon for p in src]),
+        np.array([p.lat for p in dst]),
+        np.array([p.lon for p in dst]),
+    ]
+
+    for name, func in [
+        ("calc_bearing", lambda: [calc_bearing(a, b) for a, b in zip(src, dst)]),
+        ("calc_distance", lambda: [calc_distance(a, b) for a, b in zip(src, dst)]),
+        ("travel", lambda: [travel(a, 50.0, 42.0) for a in src]),
+        ("calc_bearing_batch", lambda: calc_bearing_batch(*arrays)),
+        ("calc_distance_batch", lambda: calc_distance_batch(*arrays)),
+        ("travel_batch", lambda: travel_batch(arrays[0], arrays[1], 50.0, 42.0)),
+    ]:
+        record(
+            results,
+            f"gcmath.{name}[n={count}]",
+            measure(func, repeat),
+            count,
+            "pairs/s",
+        )
+
+
+def bench_pipeline(
+    results: dict, fleet: int, pois: int, repeat: int, rnd: random.Random
+) -> None:
+    """Pipeline stages for `fleet` aircraft and `pois` POIs"""
+    states = random_states(fleet, rnd)
+    settings = random_settings(pois, rnd)
+    table = notify.PoiTable(settings, notify.MAX_DISTANCE)
+    suffix = f"[aircraft={fleet},pois={pois}]"
+
+    record(
+        results,
+        f"AicraftState{suffix}",
+        measure(lambda: notify.AicraftState.from_states(states), repeat),
+        fleet,
+        "states/s",
+    )
+
+    record(
+        results,
+        f"PoiTable{suffix}",
+        measure(lambda: notify.PoiTable(settings, notify.MAX_DISTANCE), repeat),
+        pois,
+        "POIs/s",
+    )
+
+    notifications = []
+
+    def notifications_stage():
+        notifications[:] = notify.get_notifications(states, table)
+
+    record(
+        results,
+        f"get_notifications{suffix}",
+        measure(notifications_stage, repeat),
+        fleet,
+        "states/s",
+    )
+
+    if notifications:
+        record(
+            results,
+            f"fcm_send_batch{suffix}",
+            measure(lambda: notify.fcm_send_batch(notifications, True), repeat),
+            len(notifications),
+            "messages/s",
+        )
+
+
+@contextmanager
+def mock_firebase():
+    """Patch firebase_admin, as the fixture in test_notify.py does,
+    and keep the production log clean"""
+    mock = MockFirebaseAdmin()
+    patches = [
+        (firebase_admin, "initialize_app", mock.initialize_app),
+        (firebase_admin, "delete_app", mock.delete_app),
+        (firebase_admin, "get_app", mock.get_app),
+        (firebase_admin.messaging, "send", mock.messaging.send),
+        (firebase_admin.messaging, "send_each", mock.messaging.send_each),
+    ]
+    saved = [(obj, name, getattr(obj, name)) for obj, name, _ in patches]
+
+    for obj, name, value in patches:
+        setattr(obj, name, value)
+
+    notify.fcmlog.disabled = True
+    firebase_admin.initialize_app()
+
+    try:
+        yield mock
+    finally:
+        for obj, name, value in saved:
+            setattr(obj, name, value)
+
+        notify.fcmlog.disabled = False
+
+
+def run(
+    fleets: list[int],
+    pois: list[int],
+    repeat: int = 3,
+    max_pairs: float = MAX_PAIRS,
+    seed: int = 42,
+) -> dict:
+    """Run all benchmarks, skipping pipeline runs with more than `max_pairs`
+    aircraft × POIs. Return results."""
+    rnd = random.Random(seed)
+    results = {}
+
+    with mock_firebase():
+        for count in sorted(set(fleets + pois)):
+            bench_gcmath(results, count, repeat, rnd)
+
+        for fleet in fleets:
+            for count in pois:
+                if fleet * count <= max_pairs:
+                    bench_pipeline(results, fleet, count, repeat, rnd)
+
+    return {
+        "meta": {
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, tolerance: float) -> list[str]:
+    """Print latency ratios against baseline, return names of regressions"""
+    regressions = []
+
+    for name, result in current["results"].items():
+        if name not in baseline["results"]:
+            continue
+
+        ratio = result["latency"] / baseline["results"][name]["latency"]
+        regressed = ratio > 1.0 + tolerance
+
+        if regressed:
+            regressions.append(name)
+
+        print(f"{name:48} {ratio:8.2f}x{'  REGRESSION' if regressed else ''}")
+
+    return regressions
+
+
+def main() -> int:
+    """Run benchmarks, save and/or compare results"""
+
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+
+    parser.add_argument("--fleets", type=int, nargs="+", default=FLEETS)
+    parser.add_argument("--pois", type=int, nargs="+", default=POIS)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-pairs", type=float, default=MAX_PAIRS)
+    parser.add_argument("--save", type=Path, default=None)
+    parser.add_argument("--compare", type=Path, default=None)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+
+    args = parser.parse_args()
+
+    current = run(args.fleets, args.pois, args.repeat, args.max_pairs)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as file:
+            json.dump(current, file, indent=4)
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+
+        print(f"\nCompared to {args.compare} ({baseline['meta']['time']}):\n")
+
+        if compare(baseline, current, args.tolerance):
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
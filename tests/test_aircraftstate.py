@@ -1,6 +1,7 @@
 """Test whether incomplete AicraftState raises InsufficientData"""
 
 import pytest
+from metrics import METRICS
 from notify import AicraftState, InsufficientData
 
 
@@ -146,3 +147,39 @@ def test_state_111000():
         assert AicraftState(
             ["3de53c", "CHX24   ", "D-HHBG", "0020", None, None, 1100, 0, None, None]
         )
+
+
+def test_state_ground():
+    """Aircraft on ground, which is not notified"""
+    with pytest.raises(InsufficientData):
+        assert AicraftState(
+            ["3de53c", "CHX24   ", "D-HHBG", "0020", 52.199765, 7.772232, "ground"]
+            + [0, 0, None]
+        )
+
+
+def test_from_states(caplog):
+    """Bulk construction skips insufficient and malformed states, the latter
+    being logged and counted separately"""
+    METRICS.reset()
+    valid = ["3de53c", "CHX24   ", "D-HHBG", "0020", 52.199765, 7.772232, 1100, 0, 0, 1]
+    states, rejected = AicraftState.from_states(
+        [
+            valid,
+            [None, None, None, "0020", 52.199765, 7.772232, 1100, 0, 0, None],
+            ["3de53c", "CHX24   ", "D-HHBG", "0020", None, 7.772232, 1100, 0, 0, None],
+            ["3de53c", "CHX24   ", "D-HHBG", "0020", 52.0, 7.0, 1100, 0, None, None],
+            ["3de53c", "CHX24   ", "D-HHBG", "0020", 52.0, 7.0, "ground", 0, 0, None],
+            ["3de53c", "CHX24   ", "D-HHBG"],
+            valid + [None],
+            [None, None, "D-HHBG", "0020", 52.199765, 7.772232, 1100, 0, 0, None],
+        ]
+    )
+
+    assert rejected == 4
+    assert METRICS.collect()["values"] == {("states_malformed_total", ()): 2}
+    assert caplog.text.count("Malformed state") == 2
+    assert [state.reg for state in states] == ["D-HHBG", "D-HHBG"]
+    assert states[0].callsign == "CHX24"
+    assert states[0].pos.lat == 52.199765
+    assert not hasattr(states[0], "__dict__")
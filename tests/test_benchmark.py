@@ -0,0 +1,27 @@
+"""Test benchmark suite on small numbers, so it does not rot"""
+
+import firebase_admin
+from tests import benchmark
+
+
+def test_benchmark(capsys):
+    """Run, save and compare"""
+
+    send = firebase_admin.messaging.send_each
+    current = benchmark.run([10], [10, 30], repeat=1)
+
+    assert firebase_admin.messaging.send_each is send
+    assert "get_notifications[aircraft=10,pois=30]" in current["results"]
+    assert all(r["latency"] > 0.0 for r in current["results"].values())
+
+    slower = {
+        "meta": current["meta"],
+        "results": {
+            name: {**result, "latency": result["latency"] * 2.0}
+            for name, result in current["results"].items()
+        },
+    }
+
+    assert not benchmark.compare(current, current, 0.25)
+    assert len(benchmark.compare(current, slower, 0.25)) == len(current["results"])
+    assert "REGRESSION" in capsys.readouterr().out
@@ -0,0 +1,56 @@
+"""Test suppression of repeated notifications"""
+
+import notify
+from cooldown import CooldownStore
+from tests.test_notify import BGU, USER_SETTINGS
+
+KEY = ("3de53c", "BGU Ludwigshafen", "fcm_token")
+
+
+def test_cooldown_window(tmp_path):
+    """Combinations are admitted again only after the window has passed"""
+
+    with CooldownStore(tmp_path / "cooldown.db", 900.0) as cooldown:
+        assert cooldown.admit([KEY, KEY], now=1000.0) == [True, False]
+        assert cooldown.admit([KEY], now=1899.0) == [False]
+        assert cooldown.admit([KEY, KEY[:2] + ("other",)], now=1900.0) == [
+            True,
+            True,
+        ]
+
+
+def test_cooldown_persistent(tmp_path):
+    """Combinations are remembered across instances, until evicted"""
+
+    with CooldownStore(tmp_path / "cooldown.db", 900.0) as cooldown:
+        assert cooldown.admit([KEY], now=1000.0) == [True]
+
+    with CooldownStore(tmp_path / "cooldown.db", 900.0) as cooldown:
+        assert cooldown.admit([KEY], now=1100.0) == [False]
+        assert cooldown.evict(now=1899.0) == 0
+        assert cooldown.evict(now=2000.0) == 1
+        assert cooldown.admit([KEY], now=1100.0) == [True]
+
+
+def test_notifications_cooldown(tmp_path):
+    """get_notifications() skips combinations already notified"""
+
+    data = [
+        ["3de53c", "CHX24", "D-HHBG", "0020", BGU.lat - 0.1, BGU.lon, 1100, 0, 0, 1],
+        ["3de53d", "CHX25", "D-HHBH", "0020", BGU.lat - 0.1, BGU.lon, 1100, 0, 0, 1],
+    ]
+
+    with CooldownStore(tmp_path / "cooldown.db", 900.0) as cooldown:
+        assert len(notify.get_notifications(data, USER_SETTINGS, cooldown, 0.0)) == 2
+        assert not notify.get_notifications(data, USER_SETTINGS, cooldown, 60.0)
+        assert len(notify.get_notifications(data, USER_SETTINGS, cooldown, 900.0)) == 2
+
+
+def test_cooldown_check_record(tmp_path):
+    """check() records nothing, until keys are record()ed"""
+
+    with CooldownStore(tmp_path / "cooldown.db", 900.0) as cooldown:
+        assert cooldown.check([KEY, KEY], now=1000.0) == [True, False]
+        assert cooldown.check([KEY], now=1000.0) == [True]
+        cooldown.record([KEY], now=1000.0)
+        assert cooldown.check([KEY], now=1899.0) == [False]
@@ -2,10 +2,26 @@
 
 # pylint: disable=line-too-long, disable=too-many-statements
 
+import math
+import random
+import pytest
+import numpy as np
 from gcmath import (
+    FLAT_BEARING_ERROR,
+    FLAT_DISTANCE_ERROR,
+    FLAT_MAX_DISTANCE,
+    FLAT_MAX_LAT,
+    GEOMETRIES,
     LatLon,
     calc_bearing,
+    calc_bearing_batch,
     calc_distance,
+    calc_distance_batch,
+    calc_distance_haversine,
+    calc_bearing_distance_flat,
+    in_bounding_box,
+    in_bounding_box_batch,
+    travel_batch,
     travel,
     isclose,
     deg_to_km,
@@ -547,3 +563,198 @@ def test_overrun():
         travel(LatLon(-60.0, -30.0), 2222.222, 270.0) ==
         travel(LatLon(-60.0, -30.0), 2222.222, 630.0)
     )
+
+
+### Bounding box
+
+@pytest.mark.parametrize(
+    "origin",
+    [
+        LatLon(49.4865293, 8.3892454), LatLon(0.0, 180.0), LatLon(0.0, -180.0),
+        LatLon(12.3, -179.99), LatLon(-45.0, 179.9), LatLon(88.0, 179.5),
+        LatLon(89.9, 0.0), LatLon(-89.9, 45.0), LatLon(89.9999, -120.0),
+        LatLon(-89.3, -179.0),
+    ],
+)
+@pytest.mark.parametrize("dist", [1.0, 70.0, 500.0])
+def test_bounding_box(origin, dist):
+    """No point within `dist` is rejected, near the poles and the antimeridian,
+    and the vectorised version agrees with the scalar one"""
+    rnd = random.Random(42)
+    points = [
+        travel(origin, rnd.uniform(0.0, 3.0 * dist), rnd.uniform(0.0, 360.0))
+        for _ in range(2000)
+    ] + [
+        # Right at the border
+        travel(origin, dist * (1.0 - 1e-12), bearing)
+        for bearing in range(0, 360, 5)
+    ]
+    inside = [in_bounding_box(origin, point, dist) for point in points]
+
+    for point, box in zip(points, inside):
+        if calc_distance(origin, point) <= dist:
+            assert box, point
+
+    assert not all(inside)
+    assert list(
+        in_bounding_box_batch(
+            origin.lat,
+            origin.lon,
+            [point.lat for point in points],
+            [point.lon for point in points],
+            dist,
+        )
+    ) == inside
+
+
+### Geometries
+
+def test_haversine():
+    """Haversine and spherical law of cosines agree"""
+    rnd = random.Random(42)
+
+    for _ in range(1000):
+        src = LatLon(rnd.uniform(-90.0, 90.0), rnd.uniform(-180.0, 180.0))
+        dst = LatLon(rnd.uniform(-90.0, 90.0), rnd.uniform(-180.0, 180.0))
+
+        assert math.isclose(calc_distance_haversine(src, dst), calc_distance(src, dst), abs_tol=1e-3)
+
+
+def test_flat_errors():
+    """Flat geometry stays within its documented errors"""
+    rnd = random.Random(42)
+
+    for _ in range(10000):
+        src = LatLon(rnd.uniform(-FLAT_MAX_LAT, FLAT_MAX_LAT), rnd.uniform(-180.0, 180.0))
+        dst = travel(src, rnd.uniform(0.0, FLAT_MAX_DISTANCE), rnd.uniform(0.0, 360.0))
+        bearing, dist = calc_bearing_distance_flat(src, dst)
+
+        assert abs((bearing - calc_bearing(src, dst) + 180.0) % 360.0 - 180.0) < FLAT_BEARING_ERROR
+        assert abs(dist - calc_distance(src, dst)) < FLAT_DISTANCE_ERROR
+
+
+@pytest.mark.parametrize("name", GEOMETRIES)
+def test_geometries_trig(name):
+    """Vectorised geometries in radians give the same results as their
+    scalar versions"""
+    rnd = random.Random(42)
+    geometry = GEOMETRIES[name]
+    src = [LatLon(rnd.uniform(-FLAT_MAX_LAT, FLAT_MAX_LAT), rnd.uniform(-180.0, 180.0)) for _ in range(1000)]
+    dst = [travel(pos, rnd.uniform(0.0, FLAT_MAX_DISTANCE), rnd.uniform(0.0, 360.0)) for pos in src]
+    src_lat, src_lon, dst_lat, dst_lon = (
+        np.radians([getattr(pos, attr) for pos in positions])
+        for positions, attr in [(src, "lat"), (src, "lon"), (dst, "lat"), (dst, "lon")]
+    )
+    bearings, dists = geometry.calc_trig(src_lat, src_lon, dst_lat, dst_lon, np.sin(dst_lat), np.cos(dst_lat))
+
+    for args, bearing, dist in zip(zip(src, dst), bearings, dists):
+        expected = geometry.calc(*args)
+
+        assert abs((bearing - expected[0] + 180.0) % 360.0 - 180.0) < 1e-6, args
+        assert math.isclose(dist, expected[1], rel_tol=1e-6, abs_tol=1e-6), args
+
+
+### Batch versions
+
+SCALAR = {"travel": travel, "calc_bearing": calc_bearing, "calc_distance": calc_distance}
+
+
+def travel_via_batch(origin, dist, bear):
+    """`travel()` implemented by `travel_batch()`"""
+    lat, lon = travel_batch([origin.lat], [origin.lon], [dist], [bear])
+    return LatLon(float(lat[0]), float(lon[0]))
+
+
+def calc_bearing_via_batch(src, dst):
+    """`calc_bearing()` implemented by `calc_bearing_batch()`"""
+    return float(calc_bearing_batch([src.lat], [src.lon], [dst.lat], [dst.lon])[0])
+
+
+def calc_distance_via_batch(src, dst):
+    """`calc_distance()` implemented by `calc_distance_batch()`"""
+    return float(calc_distance_batch([src.lat], [src.lon], [dst.lat], [dst.lon])[0])
+
+
+SCALAR_TESTS = [
+    test for name, test in sorted(globals().items())
+    if name.startswith(("test_travel", "test_overrun"))
+]
+
+
+@pytest.mark.parametrize("test", SCALAR_TESTS, ids=lambda test: test.__name__)
+def test_batch_cases(monkeypatch, test):
+    """The scalar test cases pass with batch versions of the functions"""
+    monkeypatch.setitem(globals(), "travel", travel_via_batch)
+    monkeypatch.setitem(globals(), "calc_bearing", calc_bearing_via_batch)
+    monkeypatch.setitem(globals(), "calc_distance", calc_distance_via_batch)
+    test()
+
+
+def flatten(*args) -> tuple:
+    """Return arguments with positions as (lat, lon)"""
+    return tuple(v for arg in args for v in ((arg.lat, arg.lon) if isinstance(arg, LatLon) else (arg,)))
+
+
+def collect_calls(monkeypatch) -> dict[str, list[tuple]]:
+    """Run the scalar test cases, returning the flattened arguments of each
+    call of the scalar functions"""
+    calls = {name: [] for name in SCALAR}
+
+    def recording(name):
+        def record(*args):
+            calls[name].append(flatten(*args))
+            return SCALAR[name](*args)
+
+        return record
+
+    for name in SCALAR:
+        monkeypatch.setitem(globals(), name, recording(name))
+
+    for test in SCALAR_TESTS:
+        test()
+
+    monkeypatch.undo()
+
+    return calls
+
+
+def test_batch_arrays(monkeypatch):
+    """Batch versions on all scalar test cases at once, as arrays,
+    give the same results as the scalar versions"""
+    calls = collect_calls(monkeypatch)
+    res_lat, res_lon = travel_batch(*np.array(calls["travel"]).T)
+
+    for args, rlat, rlon in zip(calls["travel"], res_lat, res_lon):
+        assert travel(LatLon(args[0], args[1]), *args[2:]) == LatLon(rlat, rlon), args
+
+    for name, func in [("calc_bearing", calc_bearing_batch), ("calc_distance", calc_distance_batch)]:
+        results = func(*np.array(calls[name]).T)
+
+        for args, result in zip(calls[name], results):
+            expected = SCALAR[name](LatLon(*args[:2]), LatLon(*args[2:]))
+            assert isclose(result, expected), (name, args)
+
+
+def test_travel_batch_random():
+    """Random journeys, including the special bearings, the poles and the
+    antimeridian, give the same results as the scalar version"""
+    rnd = random.Random(42)
+    lat = [rnd.choice([90.0, -90.0, 89.99, 0.0, rnd.uniform(-90.0, 90.0)]) for _ in range(5000)]
+    lon = [rnd.choice([180.0, -180.0, 179.99, rnd.uniform(-180.0, 180.0)]) for _ in range(5000)]
+    dist = [rnd.choice([0.0, 70.0, rnd.uniform(0.0, 50000.0)]) for _ in range(5000)]
+    bear = [rnd.choice([0.0, 90.0, 180.0, 270.0, -90.0, 720.0, rnd.uniform(-360.0, 720.0)]) for _ in range(5000)]
+    res_lat, res_lon = travel_batch(lat, lon, dist, bear)
+
+    for args in zip(lat, lon, dist, bear, res_lat, res_lon):
+        try:
+            expected = travel(LatLon(args[0], args[1]), args[2], args[3])
+        except ZeroDivisionError:
+            assert np.isnan(args[5])
+            continue
+
+        if abs(args[0]) == 90.0 and args[3] % 90.0:
+            # Longitude is ill-conditioned, when departing from a pole
+            assert isclose(expected.lat, args[4]), args
+            continue
+
+        assert expected == LatLon(args[4], args[5]), args
@@ -0,0 +1,111 @@
+"""Test the SQLite store of HEMS states"""
+
+import json
+import sys
+import notify
+from hemsdb import COLUMNS, HemsStore, import_tree
+from hemsfilter import DESC, filter_adsb
+from tests.test_hemsfilter import random_adsb
+from tests.test_notify import USER_SETTINGS
+
+
+def write_tree(root):
+    """Create data/hems/<date>/*.json with two states per snapshot"""
+
+    for day in ["2025-07-01", "2025-07-02"]:
+        (root / day).mkdir(parents=True)
+
+        for n, hhmm in enumerate(["12-00", "12-03"]):
+            (root / day / f"{day}_{hhmm}.json").write_text(
+                json.dumps(
+                    {
+                        "time": 1751364000 + n * 180 + (day == "2025-07-02") * 86400,
+                        "desc": DESC,
+                        "states": [
+                            ["3de53c", "CHX24   ", "D-HHBG", "0020", 49.0, 8.0]
+                            + [1100, 0, 10.0 * n, 100],
+                            ["3de53d", "CHX25", None, "0020", 50.0, 8.0]
+                            + ["ground", None, None, 0],
+                        ],
+                    }
+                )
+            )
+
+    (root / "2025-07-02" / "broken.json").write_text("{")
+
+
+def test_import_query(tmp_path):
+    """Bulk import is idempotent, queries select by registration, ICAO and time"""
+
+    write_tree(tmp_path / "hems")
+
+    with HemsStore(tmp_path / "hems.db") as store:
+        assert import_tree(store, tmp_path / "hems") == (4, 8)
+        assert import_tree(store, tmp_path / "hems") == (4, 0)
+
+        rows = store.query(reg="D-HHBG")
+
+        assert [row[0] for row in rows] == [
+            1751364000,
+            1751364180,
+            1751450400,
+            1751450580,
+        ]
+        assert dict(zip(COLUMNS, rows[1])) == {
+            "time": 1751364180,
+            "icao": "3de53c",
+            "callsign": "CHX24",
+            "reg": "D-HHBG",
+            "squawk": "0020",
+            "lat": 49.0,
+            "lon": 8.0,
+            "alt": 1100,
+            "vrate": 0,
+            "track": 10.0,
+            "speed": 100,
+        }
+
+        rows = store.query(icao="3de53d", since=1751364180, until=1751450580)
+
+        assert [(row[0], row[7]) for row in rows] == [
+            (1751364180, "ground"),
+            (1751450400, "ground"),
+        ]
+        assert len(store.query(callsign="CHX24")) == 4
+        assert len(store.query()) == 8
+
+        # Queries use the indexes
+        plan = store.db.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM states WHERE reg = ? AND time >= ?",
+            ("D-HHBG", 0),
+        ).fetchall()
+
+        assert "states_reg" in str(plan)
+
+
+def test_notify_ingest(tmp_path, monkeypatch):
+    """notify --hems-db stores the filtered states"""
+
+    filename = tmp_path / "2025-07-01_12-00.json"
+    filename.write_text(json.dumps(random_adsb(0)))
+
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "notify",
+            "--stdout",
+            "--adsb",
+            "--no-notify",
+            "--hems-db",
+            str(tmp_path / "hems.db"),
+        ],
+    )
+    args, _ = notify.parse_args()
+
+    notify.process_file(filename, notify.PoiTable(USER_SETTINGS, 70.0), args)
+
+    hems = filter_adsb(random_adsb(0))
+
+    with HemsStore(args.hems_db) as store:
+        assert len(store.query(since=hems["time"])) == len(hems["states"]) > 0
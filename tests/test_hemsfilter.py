@@ -0,0 +1,148 @@
+"""Test filtering HEMS from ADS-B data, compared to the former jq filter"""
+
+import io
+import json
+import random
+import shutil
+import subprocess
+import pytest
+from hemsfilter import (
+    CALLSIGNS,
+    filter_adsb,
+    filter_adsb_stream,
+    is_hems,
+    iter_json_object,
+)
+
+JQ = """[
+    .ac[] |
+    select((.squawk == ("0020", "0034")) or
+            (.flight // "" | match("%s"))) |
+            [.hex, .flight, .r, .squawk, .lat, .lon, .alt_baro, .baro_rate, .track, .gs]
+] | unique"""
+
+
+def random_adsb(seed: int) -> dict:
+    """Create random ADS-B data, containing duplicates and missing values"""
+
+    rnd = random.Random(seed)
+    flights = ["CHX24   ", "CHRIS1  ", "DLH123  ", "RESQ9A ", "CHXE12", "C", None]
+    aircraft = []
+
+    for _ in range(200):
+        ac = {
+            "hex": rnd.choice(["3de53c", "3de53d", "4b1801"]),
+            "flight": rnd.choice(flights),
+            "r": rnd.choice(["D-HHBG", "D-HDRM", None]),
+            "squawk": rnd.choice(["0020", "0034", "7000", None]),
+            "lat": rnd.choice([49.5, 50.0, 50]),
+            "lon": rnd.choice([8.4, 9]),
+            "alt_baro": rnd.choice(["ground", 1100, 1100.0, None]),
+            "baro_rate": rnd.choice([0, -64, None]),
+            "track": rnd.choice([0.0, 180.5, None]),
+            "gs": rnd.choice([100.1, 0]),
+        }
+
+        for key in list(ac):
+            if rnd.random() < 0.05:
+                del ac[key]
+
+        aircraft.append(ac)
+
+    return {"ac": aircraft, "now": 1751371200000}
+
+
+@pytest.mark.parametrize(
+    "flight,expected",
+    [
+        ("CHX24   ", True),
+        ("CHXE12", True),
+        ("CHR7", True),
+        ("C1", True),
+        ("SAREX42", True),
+        ("CHX", False),
+        ("DLH123  ", False),
+        ("", False),
+    ],
+)
+def test_callsigns(flight, expected):
+    """Callsigns must be matched by regex"""
+    assert bool(CALLSIGNS.match(flight)) == expected
+
+
+def test_is_hems():
+    """Either squawk or callsign identify HEMS"""
+    assert is_hems({"squawk": "0020", "flight": None})
+    assert is_hems({"squawk": "0034"})
+    assert is_hems({"squawk": "7000", "flight": "CHX24   "})
+    assert not is_hems({"squawk": "7000", "flight": "DLH123  "})
+    assert not is_hems({})
+
+
+def test_filter_adsb():
+    """Result structure and time"""
+    adsb = filter_adsb(random_adsb(0))
+
+    assert adsb["time"] == 1751371200
+    assert len(adsb["desc"]) == 10
+    assert all(len(state) == 10 for state in adsb["states"])
+    assert filter_adsb({"ac": []}, now=42) == {
+        "time": 42,
+        "desc": adsb["desc"],
+        "states": [],
+    }
+
+
+@pytest.mark.skipif(not shutil.which("jq"), reason="jq not installed")
+@pytest.mark.parametrize("seed", range(5))
+def test_filter_adsb_jq(seed):
+    """Result must be the same as from jq"""
+
+    adsb = random_adsb(seed)
+    jq = subprocess.run(
+        ["jq", "-c", JQ % CALLSIGNS.pattern],
+        input=json.dumps(adsb),
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+
+    assert filter_adsb(adsb)["states"] == json.loads(jq.stdout)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64, 65536])
+def test_filter_adsb_stream(chunk_size):
+    """Streaming must yield the same result, regardless of chunk size"""
+
+    adsb = random_adsb(0)
+    adsb["msg"] = "No error"
+    adsb["total"] = len(adsb["ac"])
+
+    for text in [json.dumps(adsb), json.dumps(adsb, indent=4)]:
+        assert filter_adsb_stream(
+            io.StringIO(text), chunk_size=chunk_size
+        ) == filter_adsb(adsb)
+
+
+@pytest.mark.parametrize(
+    "text,expected",
+    [
+        ("{}", []),
+        ('{"ac": []}', []),
+        ('{"ac": null, "now": 12345}', [("ac", None), ("now", 12345)]),
+        (
+            '{ "now" : 1.5e3 , "ac" : [ {"a": [1, "]"]} , 2 ] }',
+            [("now", 1.5e3), ("ac[]", {"a": [1, "]"]}), ("ac[]", 2)],
+        ),
+    ],
+)
+def test_iter_json_object(text, expected):
+    """Array elements are yielded one by one, everything else as is"""
+    assert list(iter_json_object(io.StringIO(text), chunk_size=2)) == expected
+
+
+@pytest.mark.parametrize("text", ['{"ac": [1, 2}', '{"ac": [1, 2]', '{"now": 1 "ac"}'])
+def test_iter_json_object_invalid(text):
+    """Invalid JSON raises JSONDecodeError"""
+    with pytest.raises(json.JSONDecodeError):
+        list(iter_json_object(io.StringIO(text), chunk_size=3))
@@ -0,0 +1,124 @@
+"""Test metrics in the Prometheus text format"""
+
+import argparse
+import json
+import notify
+from metrics import Metrics
+from tests.test_notify import BGU, USER_SETTINGS
+
+
+def test_render():
+    """Counters and gauges by labels, histograms with cumulative buckets"""
+
+    metrics = Metrics(buckets=(0.1, 1.0))
+    metrics.inc("fcm_errors_total", code="NOT_FOUND")
+    metrics.inc("fcm_errors_total", 2, code='A "quoted"\ncode')
+    metrics.set("run_seconds", 12.5)
+    metrics.set("run_seconds", 2.5)
+
+    for value in [0.05, 0.5, 0.5, 5.0]:
+        metrics.observe("stage_seconds", value, stage="filter")
+
+    assert metrics.render() == (
+        "# HELP hems_lookout_fcm_errors_total Messages rejected by FCM, by error code\n"
+        "# TYPE hems_lookout_fcm_errors_total counter\n"
+        'hems_lookout_fcm_errors_total{code="A \\"quoted\\"\\ncode"} 2\n'
+        'hems_lookout_fcm_errors_total{code="NOT_FOUND"} 1\n'
+        "# HELP hems_lookout_run_seconds Duration of the last run, including fetch\n"
+        "# TYPE hems_lookout_run_seconds gauge\n"
+        "hems_lookout_run_seconds 2.5\n"
+        "# HELP hems_lookout_stage_seconds Duration of pipeline stages\n"
+        "# TYPE hems_lookout_stage_seconds histogram\n"
+        'hems_lookout_stage_seconds_bucket{stage="filter",le="0.1"} 1\n'
+        'hems_lookout_stage_seconds_bucket{stage="filter",le="1"} 3\n'
+        'hems_lookout_stage_seconds_bucket{stage="filter",le="+Inf"} 4\n'
+        'hems_lookout_stage_seconds_sum{stage="filter"} 6.05\n'
+        'hems_lookout_stage_seconds_count{stage="filter"} 4\n'
+    )
+
+
+def test_render_precision():
+    """Timestamps and large counters are rendered with full precision"""
+
+    metrics = Metrics()
+    metrics.set("last_run_timestamp_seconds", 1792324800.123456)
+    metrics.inc("states_total", 1234567)
+    metrics.set("run_seconds", float("inf"))
+
+    rendered = metrics.render()
+
+    assert "hems_lookout_last_run_timestamp_seconds 1792324800.123456\n" in rendered
+    assert "hems_lookout_states_total 1234567\n" in rendered
+    assert "hems_lookout_run_seconds +Inf\n" in rendered
+
+
+def test_merge():
+    """Counters and histograms are added, gauges replaced"""
+
+    worker = Metrics()
+    worker.inc("states_total", 3)
+    worker.set("run_seconds", 1.0)
+    worker.observe("stage_seconds", 0.2, stage="evaluate")
+
+    metrics = Metrics()
+    metrics.inc("states_total", 2)
+    metrics.set("run_seconds", 5.0)
+    metrics.merge(worker.collect())
+    metrics.merge(worker.collect())
+
+    assert metrics.collect()["values"] == {
+        ("states_total", ()): 8,
+        ("run_seconds", ()): 1.0,
+    }
+    assert (
+        metrics.collect()["histograms"][("stage_seconds", (("stage", "evaluate"),))][-1]
+        == 2
+    )
+
+
+def test_notify_metrics(tmp_path):
+    """Files evaluated by worker processes are counted as if processed here"""
+
+    states = [
+        ["3de53c", "CHX24", "D-HHBG", "0020", BGU.lat - 0.1, BGU.lon, 1100, 0, 0, 100],
+        ["3de53d", "CHX25", "D-HHBH", "0020", BGU.lat, BGU.lon, 1100, 0, None, 100],
+    ]
+    filenames = []
+
+    for n in range(3):
+        filenames.append(tmp_path / f"snapshot{n}.json")
+        filenames[-1].write_text(json.dumps({"time": 1000 + n, "states": states}))
+
+    args = argparse.Namespace(
+        metrics=tmp_path / "hems_lookout.prom",
+        fetch_seconds=1.5,
+        watch=None,
+        stdout=True,
+        adsb=False,
+        no_notify=False,
+        archive=None,
+        hems_db=None,
+    )
+    settings = notify.PoiTable(USER_SETTINGS, notify.MAX_DISTANCE)
+    collected = []
+
+    for jobs in [1, 3]:
+        notify.METRICS.reset()
+        notify.process_files(filenames, settings, args, jobs=jobs)
+        collected.append(notify.METRICS.collect()["values"])
+
+    assert collected[0] == collected[1]
+    assert collected[0] == {
+        ("files_total", ()): 3,
+        ("states_total", ()): 6,
+        ("states_rejected_total", ()): 3,
+        ("pairs_total", ()): 3,
+        ("notifications_total", ()): 3,
+    }
+
+    notify.write_metrics(args)
+    text = args.metrics.read_text()
+
+    assert 'hems_lookout_stage_seconds_count{stage="evaluate"} 3\n' in text
+    assert 'hems_lookout_stage_seconds_sum{stage="fetch"} 1.5\n' in text
+    assert "hems_lookout_run_seconds " in text
@@ -2,14 +2,20 @@
 around the boeder of the default radius"""
 
 from pathlib import Path
+import argparse
+import dataclasses
 import json
 import logging
+import math
 import os
+import random
 import pytest
 from requests.exceptions import HTTPError
 import firebase_admin
+import firebase_admin.messaging
 import notify
-from gcmath import LatLon, calc_distance
+from cooldown import CooldownStore
+from gcmath import GEOMETRIES, LatLon, calc_bearing, calc_distance, travel
 
 
 BGU = LatLon(49.4865293, 8.3892454)
@@ -89,6 +95,16 @@ class MockFirebaseAdmin:
                     "the SDK by calling initialize_app()."
                 )
 
+            cls.tokens.append(message.token)
+
+            if message.token == "***unavailable***":
+                raise firebase_admin.exceptions.UnavailableError(
+                    message="The service is currently unavailable",
+                    cause=HTTPError(
+                        "503 Server Error: Service Unavailable for url: https://..."
+                    ),
+                )
+
             if message.token == "***invalid***":
                 raise firebase_admin.exceptions.InvalidArgumentError(
                     message="The registration token is not a valid FCM registration token",
@@ -99,6 +115,32 @@ class MockFirebaseAdmin:
 
             return "projects/hems-lookout/messages/fake_message_id"
 
+        calls = 0
+        tokens = []
+
+        @classmethod
+        def send_each(
+            cls,
+            messages: list[firebase_admin.messaging.Message],
+            dry_run: bool = False,
+            app=None,  # pylint: disable=unused-argument
+        ):
+            """Mock sending each message, mapping exceptions to responses"""
+            cls.calls += 1
+            responses = []
+
+            for message in messages:
+                try:
+                    responses.append(
+                        firebase_admin.messaging.SendResponse(
+                            {"name": cls.send(message, dry_run)}, None
+                        )
+                    )
+                except firebase_admin.exceptions.FirebaseError as ex:
+                    responses.append(firebase_admin.messaging.SendResponse(None, ex))
+
+            return firebase_admin.messaging.BatchResponse(responses)
+
 
 @pytest.fixture(name="mock_firebase_admin")
 def fixture_mock_firebase_admin(monkeypatch):
@@ -108,6 +150,11 @@ def fixture_mock_firebase_admin(monkeypatch):
     monkeypatch.setattr(firebase_admin, "delete_app", mock.delete_app)
     monkeypatch.setattr(firebase_admin, "get_app", mock.get_app)
     monkeypatch.setattr(firebase_admin.messaging, "send", mock.messaging.send)
+    monkeypatch.setattr(firebase_admin.messaging, "send_each", mock.messaging.send_each)
+    mock.messaging.calls = 0
+    mock.messaging.tokens = []
+
+    return mock
 
 
 @pytest.fixture(name="adsb_data")
@@ -212,6 +259,155 @@ def test_bearing_non_notifyable(adsb_data):
     assert len(notifications) == 0
 
 
+@pytest.mark.parametrize(
+    "filename", ["test_notify_distance.json", "test_notify_bearing.json"]
+)
+def test_find_hits(adsb_data):
+    """Vectorised evaluation must yield the same result as isnotifyable()"""
+
+    states = [notify.AicraftState(d) for d in adsb_data]
+
+    expected = [notify.isnotifyable(state, BGU) for state in states]
+    hits, pois = notify.find_hits(
+        states, notify.PoiTable(USER_SETTINGS, notify.MAX_DISTANCE)
+    )
+
+    assert not pois.any()
+    assert [n in hits for n in range(len(states))] == expected
+
+
+@pytest.mark.parametrize("geometry", GEOMETRIES)
+@pytest.mark.parametrize(
+    "poi",
+    [BGU, LatLon(74.9, 179.9), LatLon(-76.0, -179.95), LatLon(0.0, 180.0)],
+)
+def test_geometry(monkeypatch, geometry, poi):
+    """All geometries must yield the same notifications as the spherical one,
+    the flat one by falling back to it where too close to call"""
+
+    rnd = random.Random(42)
+    data = []
+
+    for n in range(2000):
+        pos = travel(
+            poi, rnd.uniform(0.0, 1.5 * notify.MAX_DISTANCE), rnd.uniform(0, 360)
+        )
+        # Head roughly towards the POI, so many states are close to the boundaries
+        track = (calc_bearing(pos, poi) + rnd.uniform(-10.0, 10.0)) % 360.0
+        data.append(
+            [f"{n:06x}", f"CHX{n}", None, "0020", pos.lat, pos.lon, 1100, 0, track, 100]
+        )
+
+    settings = [
+        {
+            "recipient": "token",
+            "locations": [{"name": "POI", "lat": poi.lat, "lon": poi.lon}],
+        }
+    ]
+    states = [notify.AicraftState(d) for d in data]
+
+    monkeypatch.setattr(notify, "GEOMETRY", "spherical")
+    expected = [notify.isnotifyable(state, poi) for state in states]
+    notifications = [
+        n["message"].callsign for n in notify.get_notifications(data, settings)
+    ]
+
+    # Count calls of the geometry selected, to make sure it is used
+    calls = {"calc": 0, "calc_trig": 0}
+
+    def counting(name, function):
+        def count(*args):
+            calls[name] += 1
+            return function(*args)
+
+        return count
+
+    backend = GEOMETRIES[geometry]
+    monkeypatch.setitem(
+        GEOMETRIES,
+        geometry,
+        dataclasses.replace(
+            backend,
+            calc=counting("calc", backend.calc),
+            calc_trig=counting("calc_trig", backend.calc_trig),
+        ),
+    )
+    monkeypatch.setattr(notify, "GEOMETRY", geometry)
+
+    assert any(expected)
+    assert [notify.isnotifyable(state, poi) for state in states] == expected
+    assert [
+        n["message"].callsign for n in notify.get_notifications(data, settings)
+    ] == notifications
+    assert len(notifications) == expected.count(True)
+    # Beyond its validity, the flat geometry is skipped by isnotifyable()
+    assert calls["calc_trig"] and (calls["calc"] or abs(poi.lat) > backend.max_lat)
+
+
+def test_notifications_order():
+    """Notifications must be ordered by state, then unique POI, then recipient"""
+
+    settings = [
+        {
+            "recipient": recipient,
+            "locations": [
+                {"name": "BGU Ludwigshafen", "lat": BGU.lat, "lon": BGU.lon},
+                {"name": "Elsewhere", "lat": -BGU.lat, "lon": BGU.lon},
+                {"name": "BGU again", "lat": BGU.lat, "lon": BGU.lon},
+            ],
+        }
+        for recipient in ["first", "second"]
+    ]
+
+    data = [
+        ["3de53c", "CHX24", "D-HHBG", "0020", 49.0, BGU.lon, 1100, 0, 0, 100],
+        [None, None, None, "0020", 49.0, BGU.lon, 1100, 0, 0, 100],
+        ["3de53d", "CHX25", "D-HHBH", "0020", 50.0, BGU.lon, 1100, 0, 180, 100],
+    ]
+
+    notifications = notify.get_notifications(data, settings)
+
+    assert [
+        (n["message"].callsign, n["recipient"], n["message"].location)
+        for n in notifications
+    ] == [
+        (callsign, recipient, location)
+        for callsign in ["CHX24", "CHX25"]
+        for location in ["BGU Ludwigshafen", "BGU again"]
+        for recipient in ["first", "second"]
+    ]
+
+
+def test_poi_table():
+    """Shared POIs must be stored once, listing all of their recipients"""
+
+    settings = [
+        {
+            "recipient": "first",
+            "locations": [
+                {"name": "BGU Ludwigshafen", "lat": BGU.lat, "lon": BGU.lon},
+                {"name": "Elsewhere", "lat": -BGU.lat, "lon": BGU.lon},
+            ],
+        },
+        {
+            "recipient": "second",
+            "locations": [
+                {"name": "BGU Ludwigshafen", "lat": BGU.lat, "lon": BGU.lon},
+                {"name": "BGU Ludwigshafen", "lat": BGU.lat, "lon": BGU.lon},
+            ],
+        },
+    ]
+
+    table = notify.PoiTable(settings, notify.MAX_DISTANCE)
+
+    assert len(table) == 2
+    assert table.names == ["BGU Ludwigshafen", "Elsewhere"]
+    assert table.recipients == [["first", "second"], ["first"]]
+    assert table.sin_lat.tolist() == pytest.approx(
+        [math.sin(math.radians(BGU.lat)), -math.sin(math.radians(BGU.lat))]
+    )
+
+
 def test_fcm_send_no_init(
     mock_firebase_admin, caplog  # pylint: disable=unused-argument
 ):
@@ -275,3 +471,282 @@ def test_fcm_send(
     notify.fcm_terminate()
 
     assert 0 == len(caplog.text)
+
+
+def test_fcm_send_batch(
+    fcm_auth_json, mock_firebase_admin, caplog  # pylint: disable=unused-argument
+):
+    """fcm_send_batch() must report errors per message and send in chunks"""
+
+    assert fcm_auth_json
+
+    caplog.set_level(logging.ERROR)
+
+    message = notify.Message(
+        reg="D-H???", callsign="CHX666", location="Somewhere", href="https://foo"
+    )
+    notifications = [
+        {"recipient": "valid", "message": message}
+    ] * notify.FCM_BATCH_SIZE + [{"recipient": "***invalid***", "message": message}]
+
+    notify.fcm_init(fcm_auth_json)
+    notify.fcm_send_batch(notifications, dry_run=True)
+    notify.fcm_terminate()
+
+    assert mock_firebase_admin.messaging.calls == 2
+    assert caplog.text.count("INVALID_ARGUMENT: 400 Client Error") == 1
+
+
+def test_fcm_send_batch_no_init(
+    mock_firebase_admin, caplog  # pylint: disable=unused-argument
+):
+    """fcm_send_batch() must report no default firebase app for each message"""
+
+    caplog.set_level(logging.ERROR)
+
+    message = notify.Message(
+        reg="D-H???", callsign="CHX666", location="Somewhere", href="https://foo"
+    )
+    notify.fcm_send_batch(
+        [{"recipient": "valid", "message": message}] * 2,
+        dry_run=True,
+    )
+
+    assert caplog.text.count("The default Firebase app does not exist.") == 2
+
+
+def test_fcm_dispatcher(
+    fcm_auth_json, mock_firebase_admin, caplog  # pylint: disable=unused-argument
+):
+    """FcmDispatcher must retry transient errors only, and send everything else"""
+
+    assert fcm_auth_json
+
+    caplog.set_level(logging.ERROR)
+
+    message = notify.Message(
+        reg="D-H???", callsign="CHX666", location="Somewhere", href="https://foo"
+    )
+    tokens = [f"valid{i}" for i in range(10)] + ["***invalid***", "***unavailable***"]
+
+    notify.fcm_init(fcm_auth_json)
+    notify.METRICS.reset()
+
+    with notify.FcmDispatcher(workers=3, retries=2, backoff=0.0) as dispatcher:
+        dispatcher.dispatch(
+            [{"recipient": token, "message": message} for token in tokens],
+            dry_run=True,
+        )
+
+    notify.fcm_terminate()
+
+    sent = mock_firebase_admin.messaging.tokens
+
+    assert sorted(set(sent)) == sorted(tokens)
+    assert sent.count("***invalid***") == 1
+    assert sent.count("***unavailable***") == 3
+    assert mock_firebase_admin.messaging.calls == 3 + 2
+    assert caplog.text.count("INVALID_ARGUMENT: 400 Client Error") == 1
+    assert caplog.text.count("UNAVAILABLE: 503 Server Error") == 1
+
+    # Only final results are counted, all requests are timed
+    values = notify.METRICS.collect()["values"]
+
+    assert values[("fcm_sent_total", ())] == 10
+    assert values[("fcm_errors_total", (("code", "INVALID_ARGUMENT"),))] == 1
+    assert values[("fcm_errors_total", (("code", "UNAVAILABLE"),))] == 1
+    assert notify.METRICS.collect()["histograms"][("fcm_send_seconds", ())][-1] == 5
+
+
+def test_deliver_cooldown(
+    tmp_path, fcm_auth_json, mock_firebase_admin  # pylint: disable=unused-argument
+):
+    """deliver() records only notifications sent successfully in the cooldown,
+    so failed ones are retried with the next snapshot"""
+
+    assert fcm_auth_json
+
+    settings = notify.PoiTable(
+        USER_SETTINGS + [dict(USER_SETTINGS[0], recipient="***invalid***")],
+        notify.MAX_DISTANCE,
+    )
+    state = ["3de53c", "CHX24", "D-HHBG", "0020", BGU.lat - 0.1, BGU.lon, 1100, 0, 0]
+    candidates = notify.get_candidates([state + [1]], settings)
+    args = argparse.Namespace(stdout=False, dry_run=True)
+
+    notify.fcm_init(fcm_auth_json)
+
+    try:
+        with CooldownStore(tmp_path / "cooldown.db", 900.0) as cooldown:
+            assert notify.deliver(tmp_path, 0.0, candidates, args, None, cooldown) == 1
+            assert notify.deliver(tmp_path, 60.0, candidates, args, None, cooldown) == 0
+
+            keys = notify.cooldown_keys(candidates)
+            assert cooldown.check(keys, 60.0) == [
+                key[2] == "***invalid***" for key in keys
+            ]
+    finally:
+        notify.fcm_terminate()
+
+    assert sorted(mock_firebase_admin.messaging.tokens) == [
+        "***invalid***",
+        "***invalid***",
+        "fcm_token",
+    ]
+
+
+def test_fcm_dispatcher_backoff():
+    """Backoff must grow exponentially, with jitter, up to a maximum"""
+
+    dispatcher = notify.FcmDispatcher(workers=1, backoff=1.0, max_backoff=8.0)
+    dispatcher.close()
+
+    for attempt, delay in enumerate([1.0, 2.0, 4.0, 8.0, 8.0]):
+        assert delay / 2.0 <= dispatcher.delay(attempt) <= delay
+
+
+def test_fcm_dispatcher_no_hits(
+    tmp_path, fcm_auth_json, mock_firebase_admin  # pylint: disable=unused-argument
+):
+    """Snapshots without hits pass the FCM path without sending anything"""
+
+    assert fcm_auth_json
+
+    filename = tmp_path / "2025-07-01_12-00.json"
+    filename.write_text(
+        json.dumps(
+            {
+                "states": [
+                    ["3de53c", "CHX24", "D-HHBG", "0020", 0.0, 0.0, 1100, 0, 0, 100]
+                ]
+            }
+        )
+    )
+    args = argparse.Namespace(
+        stdout=False,
+        dry_run=True,
+        adsb=False,
+        no_notify=False,
+        archive=None,
+        hems_db=None,
+    )
+
+    with pytest.raises(ValueError):
+        notify.FcmDispatcher(workers=0)
+
+    notify.fcm_init(fcm_auth_json)
+
+    try:
+        with notify.FcmDispatcher(workers=2) as dispatcher:
+            dispatcher.dispatch([])
+            settings = notify.PoiTable(USER_SETTINGS, notify.MAX_DISTANCE)
+
+            assert notify.process_file(filename, settings, args, dispatcher) == 0
+    finally:
+        notify.fcm_terminate()
+
+    assert mock_firebase_admin.messaging.calls == 0
+
+
+def test_process_files_jobs(tmp_path, capsys):
+    """Files evaluated in parallel are delivered in order of snapshot time,
+    so only the earliest one passes the cooldown"""
+
+    state = ["3de53c", "CHX24", "D-HHBG", "0020", 49.0, BGU.lon, 1100, 0, 0, 100]
+    filenames = []
+
+    # Names not matching snapshot time, on purpose
+    for n, now in enumerate([1000, 400, 700, 100, 1300]):
+        filenames.append(tmp_path / f"snapshot{n}.json")
+        filenames[-1].write_text(json.dumps({"time": now, "states": [state]}))
+
+    filenames.append(tmp_path / "broken.json")
+    filenames[-1].write_text("{")
+
+    args = argparse.Namespace(
+        stdout=True, adsb=False, no_notify=False, archive=None, hems_db=None
+    )
+    settings = notify.PoiTable(USER_SETTINGS, notify.MAX_DISTANCE)
+
+    with CooldownStore(":memory:", 3600.0) as cooldown:
+        notified = notify.process_files(
+            filenames, settings, args, cooldown=cooldown, jobs=3
+        )
+
+    output = capsys.readouterr().out
+
+    assert notified == 1
+    assert output.startswith(f"=== {tmp_path / 'snapshot3.json'} ===")
+
+    notified = notify.process_files(filenames, settings, args, jobs=3)
+
+    assert notified == len(filenames) - 1
+    assert [line for line in capsys.readouterr().out.split("\n") if "===" in line] == [
+        f"=== {tmp_path / name} ==="
+        for name in ["snapshot3.json", "snapshot1.json", "snapshot2.json"]
+        + ["snapshot0.json", "snapshot4.json"]
+    ]
+
+
+def test_init_worker(capsys, monkeypatch):
+    """Workers replace queue handlers inherited, as no listener runs there"""
+
+    monkeypatch.setattr(notify, "_worker_settings", None)
+    monkeypatch.setattr(notify, "GEOMETRY", notify.GEOMETRY)
+    handlers = logging.getLogger().handlers[:]
+    level = logging.getLogger().level
+    logging.getLogger().addHandler(notify.DroppingQueueHandler(notify.queue.Queue(1)))
+
+    try:
+        notify.init_worker(None, notify.GEOMETRY)
+        logging.info("worker")
+
+        assert not any(
+            isinstance(handler, notify.DroppingQueueHandler)
+            for handler in logging.getLogger().handlers
+        )
+    finally:
+        logging.getLogger().handlers[:] = handlers
+        logging.getLogger().setLevel(level)
+
+    assert capsys.readouterr().err.endswith(": worker\n")
+
+
+def test_setup_logging(tmp_path, monkeypatch):
+    """Log records are written by listener threads, the log is rotated"""
+
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setattr(notify, "LOG_MAX_BYTES", 1000)
+    handlers = (logging.getLogger().handlers[:], notify.fcmlog.handlers[:])
+    level = logging.getLogger().level
+
+    try:
+        listeners = notify.setup_logging()
+
+        for n in range(100):
+            notify.fcmlog.info("? CHX%d\nD-HXXX", n)
+            notify.fcmlog.info("=")
+
+        for listener in listeners:
+            listener.stop()
+    finally:
+        logging.getLogger().handlers[:], notify.fcmlog.handlers[:] = handlers
+        logging.getLogger().setLevel(level)
+
+    lines = (tmp_path / "hems-lookout.log").read_text().splitlines()
+
+    assert lines[-2].endswith("? CHX99 D-HXXX") and lines[-1].endswith(" =")
+    assert len(list(tmp_path.glob("hems-lookout.log.*"))) == notify.LOG_BACKUPS
+
+    # A full queue drops records instead of blocking
+    notify.METRICS.reset()
+    logger = logging.getLogger("test_setup_logging")
+    logger.propagate = False
+    logger.addHandler(notify.DroppingQueueHandler(notify.queue.Queue(1)))
+
+    logger.warning("queued")
+    logger.warning("dropped")
+
+    assert notify.METRICS.collect()["values"] == {
+        ("log_dropped_total", (("logger", "test_setup_logging"),)): 1
+    }
@@ -0,0 +1,53 @@
+"""Test spatial POI index"""
+
+import random
+import pytest
+from gcmath import LatLon, calc_distance, travel
+from pois import PoiIndex
+
+RADIUS = 70.0
+
+
+@pytest.mark.parametrize(
+    "origin",
+    [
+        LatLon(49.4865293, 8.3892454),
+        LatLon(0.0, 180.0),
+        LatLon(12.3, -179.99),
+        LatLon(89.9, 0.0),
+        LatLon(-89.9, 45.0),
+        LatLon(89.9999, -120.0),
+    ],
+)
+def test_index_finds_all_near(origin):
+    """All POIs within radius must be returned, wherever they are"""
+
+    rnd = random.Random(42)
+
+    pois = [
+        travel(origin, rnd.uniform(0.0, 2.0 * RADIUS), rnd.uniform(0.0, 360.0))
+        for _ in range(1000)
+    ]
+    index = PoiIndex(pois, RADIUS)
+
+    assert len(index) == len(pois)
+
+    for pos in pois[:100]:
+        expected = [
+            i for i, poi in enumerate(pois) if calc_distance(pos, poi) <= RADIUS
+        ]
+        candidates = index.query(pos)
+
+        assert candidates == sorted(candidates)
+        assert set(expected) <= set(candidates)
+
+
+def test_index_prunes_far():
+    """POIs far beyond the radius must not be returned"""
+
+    bgu = LatLon(49.4865293, 8.3892454)
+    pois = [travel(bgu, 500.0 + 10.0 * i, 10.0 * i) for i in range(36)] + [bgu]
+    index = PoiIndex(pois, RADIUS)
+
+    assert index.query(bgu) == [36]
+    assert not index.query(LatLon(-49.4865293, 8.3892454))
@@ -0,0 +1,43 @@
+"""Test the built-in profiling of a run"""
+
+import json
+import sys
+import pstats
+import notify
+from tests.test_notify import BGU, USER_SETTINGS
+
+
+def test_profile(tmp_path, monkeypatch, capsys):
+    """notify --profile writes cProfile data and a summary next to the log"""
+
+    monkeypatch.setenv("HOME", str(tmp_path))
+    monkeypatch.setattr(notify, "setup_logging", list)
+    (tmp_path / "hems-lookout-users.json").write_text(json.dumps(USER_SETTINGS))
+
+    filename = tmp_path / "2025-07-01_12-00.json"
+    filename.write_text(
+        json.dumps(
+            {
+                "states": [
+                    ["3de53c", "CHX24", "D-HHBG", "0020"]
+                    + [BGU.lat - 0.1, BGU.lon, 1100, 0, 0, 100]
+                ]
+            }
+        )
+    )
+
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        ["notify", "--stdout", "--profile", "--profile-top", "5", str(filename)],
+    )
+    notify.main()
+
+    assert "CHX24" in capsys.readouterr().out
+
+    (summary,) = tmp_path.glob("hems-lookout-profile-*.txt")
+    text = summary.read_text()
+
+    assert "notify.py" in text and "(run)" in text
+    assert "Peak traced memory" in text
+    assert pstats.Stats(str(summary.with_suffix(".prof"))).total_calls > 0
@@ -0,0 +1,65 @@
+"""Test replaying archived ADS-B data"""
+
+import json
+import lzma
+import pytest
+import notify
+import replay
+from tests.test_hemsfilter import random_adsb
+from tests.test_notify import USER_SETTINGS
+
+
+@pytest.fixture(name="days")
+def fixture_days(tmp_path):
+    """Create two days of xz compressed ADS-B data"""
+
+    days = []
+
+    for day in ["2025-07-01", "2025-07-02"]:
+        (tmp_path / day).mkdir()
+        days.append(tmp_path / day)
+
+        for n, time in enumerate(["12-00", "12-03", "12-06"]):
+            adsb = random_adsb(n)
+            adsb["now"] += n * 180000
+
+            with lzma.open(tmp_path / day / f"{day}_{time}.json.xz", "wt") as file:
+                json.dump(adsb, file)
+
+    # Corrupt file is reported, but does not stop replay
+    (tmp_path / "2025-07-02" / "2025-07-02_12-09.json.xz").write_bytes(b"garbage")
+
+    return days
+
+
+def test_replay(days, monkeypatch):
+    """Parallel and serial replay must yield the same result"""
+
+    monkeypatch.setattr(notify, "TRACK_DEVIATION", notify.TRACK_DEVIATION)
+    monkeypatch.setattr(notify, "MAX_DISTANCE", notify.MAX_DISTANCE)
+
+    serial = replay.replay(days, USER_SETTINGS, jobs=1)
+    parallel = replay.replay(days, USER_SETTINGS, jobs=2)
+
+    assert serial["snapshots"] == parallel["snapshots"] == 6
+    assert serial["errors"] == parallel["errors"] == 1
+    assert serial["notifications"] == parallel["notifications"]
+    assert serial["aircraft"] == parallel["aircraft"]
+    assert list(serial["notifications"]) == [("BGU Ludwigshafen", "fcm_token")]
+
+
+def test_replay_parameters(days, monkeypatch):
+    """Parameters affect the result"""
+
+    monkeypatch.setattr(notify, "TRACK_DEVIATION", notify.TRACK_DEVIATION)
+    monkeypatch.setattr(notify, "MAX_DISTANCE", notify.MAX_DISTANCE)
+
+    default = replay.replay(days, USER_SETTINGS)
+    narrow = replay.replay(days, USER_SETTINGS, max_distance=1.0)
+    cooldown = replay.replay(days, USER_SETTINGS, cooldown=15.0)
+
+    assert sum(default["notifications"].values()) > 0
+    assert not narrow["notifications"]
+    assert sum(cooldown["notifications"].values()) < sum(
+        default["notifications"].values()
+    )
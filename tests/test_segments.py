@@ -0,0 +1,156 @@
+"""Test the segment log of compressed ADS-B snapshots"""
+
+import argparse
+import json
+import lzma
+import time
+import pytest
+import notify
+import replay
+from segments import SegmentLog, convert, snapshot_time
+from tests.test_hemsfilter import random_adsb
+from tests.test_notify import USER_SETTINGS
+
+
+def local(day: str, hhmm: str) -> int:
+    """Return local time of `day` and `hhmm`"""
+    return int(time.mktime(time.strptime(f"{day} {hhmm}", "%Y-%m-%d %H-%M")))
+
+
+def test_append_read(tmp_path):
+    """Snapshots can be read back at random, in the order of time"""
+
+    log = SegmentLog(tmp_path / "adsb")
+    times = [local("2025-07-01", hhmm) for hhmm in ["12-00", "12-06", "12-03"]]
+
+    for n, timestamp in enumerate(times):
+        log.append(f'{{"n": {n}}}'.encode(), timestamp)
+
+    log.append(b'{"n": 3}', local("2025-07-02", "12-00"))
+
+    assert log.days() == ["2025-07-01", "2025-07-02"]
+    assert [t for t, _, _ in log.index("2025-07-01")] == sorted(times)
+    assert log.get(times[2]) == b'{"n": 2}'
+    assert log.find(times[2] + 60) == (
+        "2025-07-01",
+        times[2],
+        *log.index("2025-07-01")[1][1:],
+    )
+    assert log.find(times[0] - 60) is None
+    assert [json.loads(data)["n"] for _, data in log.snapshots("2025-07-01")] == [
+        0,
+        2,
+        1,
+    ]
+
+    with pytest.raises(KeyError):
+        log.get(times[0] + 1)
+
+    # The segment as a whole is valid xz
+    assert lzma.decompress(log.segment("2025-07-01").read_bytes()) == (
+        b'{"n": 0}{"n": 1}{"n": 2}'
+    )
+
+    # An interrupted append leaves an incomplete index line, which is ignored
+    with open(tmp_path / "adsb" / "2025-07-01.idx", "a", encoding="ascii") as file:
+        file.write(f"{times[0] + 1} 12")
+
+    assert len(log.index("2025-07-01")) == 3
+
+    _, offset, length = log.index("2025-07-01")[2]
+
+    with log.open("2025-07-01", offset, length) as file:
+        assert json.load(file) == {"n": 1}
+
+
+def test_convert(tmp_path, monkeypatch):
+    """Existing archives are converted without changing replay results"""
+
+    monkeypatch.setattr(notify, "TRACK_DEVIATION", notify.TRACK_DEVIATION)
+    monkeypatch.setattr(notify, "MAX_DISTANCE", notify.MAX_DISTANCE)
+
+    days = []
+
+    for day in ["2025-07-01", "2025-07-02"]:
+        (tmp_path / day).mkdir()
+        days.append(tmp_path / day)
+
+        for n, hhmm in enumerate(["12-00", "12-03", "12-06"]):
+            with lzma.open(tmp_path / day / f"{day}_{hhmm}.json.xz", "wt") as file:
+                json.dump(random_adsb(n), file)
+
+    before = replay.replay(days, USER_SETTINGS)
+    log = SegmentLog(tmp_path)
+
+    assert convert(log) == 6
+    # Resumable, and files kept are not replayed twice
+    assert convert(log) == 0
+    assert replay.replay(days, USER_SETTINGS)["snapshots"] == 6
+
+    assert convert(log, remove=True) == 0
+    assert not days[0].exists() and not days[1].exists()
+
+    after = replay.replay(days, USER_SETTINGS)
+
+    assert after["snapshots"] == before["snapshots"] == 6
+    assert after["notifications"] == before["notifications"]
+    assert log.get(local("2025-07-02", "12-03")) == json.dumps(random_adsb(1)).encode()
+
+
+def test_notify_archive(tmp_path):
+    """notify --archive appends the snapshot processed and removes the file"""
+
+    (tmp_path / "adsb" / "2025-07-01").mkdir(parents=True)
+    filename = tmp_path / "adsb" / "2025-07-01" / "2025-07-01_12-00.json"
+    filename.write_text(json.dumps(random_adsb(0)))
+
+    args = argparse.Namespace(
+        stdout=True,
+        adsb=True,
+        save_hems=None,
+        no_notify=True,
+        archive=tmp_path / "adsb",
+        hems_db=None,
+    )
+
+    notify.process_file(filename, notify.PoiTable(USER_SETTINGS, 70.0), args)
+
+    assert not filename.exists()
+    assert json.loads(SegmentLog(tmp_path / "adsb").get(snapshot_time(filename))) == (
+        random_adsb(0)
+    )
+
+
+def test_notify_archive_after_delivery(tmp_path, monkeypatch):
+    """Snapshots are archived only after their notifications are delivered,
+    one by one, as well as evaluated by workers"""
+
+    filenames = []
+    delivered = []
+
+    for minute in range(2):
+        filenames.append(tmp_path / "2025-07-01" / f"2025-07-01_12-0{minute}.json")
+        filenames[-1].parent.mkdir(exist_ok=True)
+        filenames[-1].write_text(json.dumps(random_adsb(minute)))
+
+    def deliver(filename, *_):
+        delivered.append(filename.exists())
+        return 0
+
+    monkeypatch.setattr(notify, "deliver", deliver)
+    args = argparse.Namespace(
+        stdout=True,
+        adsb=True,
+        save_hems=None,
+        no_notify=False,
+        archive=tmp_path,
+        hems_db=None,
+    )
+
+    notify.process_file(filenames[0], notify.PoiTable(USER_SETTINGS, 70.0), args)
+    notify.deliver_results(
+        [(filenames[1], None, [], None, {"values": {}, "histograms": {}})], args
+    )
+
+    assert delivered == [True, True]
+    assert not any(filename.exists() for filename in filenames)
@@ -0,0 +1,54 @@
+"""Test startup is kept fast"""
+
+import subprocess
+import sys
+from pathlib import Path
+import notify
+
+
+def test_lazy_firebase_import():
+    """Importing notify must neither import firebase_admin nor create log files"""
+
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import logging, sys, notify; "
+            "print('firebase_admin' in sys.modules, logging.getLogger('fcmlog').handlers)",
+        ],
+        capture_output=True,
+        check=True,
+        cwd=Path(__file__).parent.parent,
+        text=True,
+    )
+
+    assert result.stdout.strip() == "False []"
+
+
+def test_startup_timer():
+    """Phases are reported, including time since process start"""
+
+    startup = notify.StartupTimer()
+    startup.lap("settings")
+
+    assert 0.0 < notify.uptime()
+    assert [phase for phase, _ in startup.phases] == [
+        "interpreter and imports",
+        "settings",
+    ]
+    assert startup.total >= startup.phases[0][1] > 0.0
+    assert "total" in startup.report()
+
+
+def test_startup_budget():
+    """Importing notify must stay well within the startup budget"""
+
+    result = subprocess.run(
+        [sys.executable, "-c", "import notify; print(notify.uptime())"],
+        capture_output=True,
+        check=True,
+        cwd=Path(__file__).parent.parent,
+        text=True,
+    )
+
+    assert float(result.stdout) < notify.STARTUP_BUDGET
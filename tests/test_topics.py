@@ -0,0 +1,152 @@
+"""Test per-POI FCM topics and their incremental subscription sync"""
+
+import re
+import firebase_admin.messaging
+import notify
+import topics
+from pois import TOPIC_PREFIX, PoiTable
+from topics import TopicStore, sync
+from tests.test_notify import BGU
+
+
+class MockMessaging:
+    """Mock topic management of firebase_admin.messaging, failing for
+    tokens starting with "bad" and, as a whole, if `down`"""
+
+    def __init__(self):
+        self.calls = []
+        self.down = False
+
+    def respond(self, action: str, tokens: list[str], topic: str):
+        """Record the call, respond with an error per bad token"""
+        self.calls.append((action, topic, list(tokens)))
+
+        if self.down:
+            raise firebase_admin.exceptions.UnavailableError("Service unavailable")
+
+        return firebase_admin.messaging.TopicManagementResponse(
+            {
+                "results": [
+                    {"error": "INVALID_ARGUMENT"} if token.startswith("bad") else {}
+                    for token in tokens
+                ]
+            }
+        )
+
+    def subscribe_to_topic(self, tokens: list[str], topic: str):
+        """Mock subscribe"""
+        return self.respond("subscribe", tokens, topic)
+
+    def unsubscribe_from_topic(self, tokens: list[str], topic: str):
+        """Mock unsubscribe"""
+        return self.respond("unsubscribe", tokens, topic)
+
+
+def settings(recipients: dict[str, list[str]]) -> list[dict]:
+    """Return user settings of recipients watching POIs by name"""
+    pois = {
+        "BGU Ludwigshafen": (BGU.lat, BGU.lon),
+        "Somewhere": (50.0, 8.0),
+    }
+
+    return [
+        {
+            "recipient": recipient,
+            "locations": [
+                {"name": name, "lat": pois[name][0], "lon": pois[name][1]}
+                for name in names
+            ],
+        }
+        for recipient, names in recipients.items()
+    ]
+
+
+def test_sync(tmp_path, monkeypatch):
+    """Only changed subscriptions are synced, failed ones retried"""
+
+    monkeypatch.setattr(topics, "TOPIC_BATCH_SIZE", 2)
+    messaging = MockMessaging()
+    users = {
+        "a": ["BGU Ludwigshafen", "Somewhere"],
+        "b": ["BGU Ludwigshafen"],
+        "c": ["BGU Ludwigshafen"],
+        "bad": ["Somewhere"],
+    }
+    table = PoiTable(settings(users), 70.0)
+    bgu, somewhere = table.topics
+
+    assert re.fullmatch(r"[a-zA-Z0-9-_.~%]+", bgu) and bgu != somewhere
+
+    with TopicStore(tmp_path / "topics.db") as store:
+        assert sync(store, table.subscriptions(), messaging) == (4, 0)
+        assert sorted(messaging.calls) == [
+            ("subscribe", bgu, ["a", "b"]),
+            ("subscribe", bgu, ["c"]),
+            ("subscribe", somewhere, ["a", "bad"]),
+        ]
+
+    # Nothing changed, but the failed subscription is retried
+    messaging.calls = []
+
+    with TopicStore(tmp_path / "topics.db") as store:
+        assert sync(store, table.subscriptions(), messaging) == (0, 0)
+        assert messaging.calls == [("subscribe", somewhere, ["bad"])]
+
+    del users["bad"]
+    users["b"] = ["Somewhere"]
+    users["d"] = ["BGU Ludwigshafen"]
+    table = PoiTable(settings(users), 70.0)
+    messaging.calls = []
+
+    with TopicStore(tmp_path / "topics.db") as store:
+        # Requests failing as a whole are retried, unsubscribing too
+        messaging.down = True
+        assert sync(store, table.subscriptions(), messaging) == (0, 0)
+
+        messaging.down = False
+        messaging.calls = []
+        assert sync(store, table.subscriptions(), messaging) == (2, 1)
+        assert sorted(messaging.calls) == [
+            ("subscribe", bgu, ["d"]),
+            ("subscribe", somewhere, ["b"]),
+            ("unsubscribe", bgu, ["b"]),
+        ]
+        assert store.subscriptions() == table.subscriptions()
+
+
+def test_topic_notifications():
+    """With topics, one message is sent per aircraft and POI hit to the
+    recipients confirmed to be subscribed, the others are sent directly"""
+
+    users = {f"token{n}": ["BGU Ludwigshafen"] for n in range(100)}
+    table = PoiTable(settings(users), 70.0, topics=True)
+    state = ["3de53c", "CHX24", "D-HHBG", "0020", BGU.lat - 0.1, BGU.lon]
+    state += [1100, 0, 0, 100]
+
+    assert len(notify.get_notifications([state], settings(users))) == 100
+
+    # Nothing confirmed yet
+    assert len(notify.get_notifications([state], table)) == 100
+
+    subscriptions = table.subscriptions()
+    subscriptions[table.topics[0]] -= {"token98", "token99"}
+    table.confirm(subscriptions)
+    notifications = notify.get_notifications([state], table)
+
+    assert [n["recipient"] for n in notifications] == [
+        TOPIC_PREFIX + table.topics[0],
+        "token98",
+        "token99",
+    ]
+
+    message = notify.fcm_message(
+        notifications[0]["recipient"], notifications[0]["message"]
+    )
+
+    assert message.topic == table.topics[0] and message.token is None
+    assert notify.fcm_message("token0", notifications[0]["message"]).token == "token0"
+
+    # Without topics, confirmed subscriptions do not matter
+    table = PoiTable(settings(users), 70.0)
+    table.confirm(subscriptions)
+    assert len(notify.get_notifications([state], table)) == 100
@@ -0,0 +1,134 @@
+"""Test the track history smoothing and deriving tracks"""
+
+import math
+import notify
+from gcmath import LatLon, calc_bearing, travel
+from notify import AicraftState
+from tracks import TrackHistory, circular_mean
+from tests.test_notify import BGU, USER_SETTINGS
+
+
+def state(pos: LatLon, track, icao="3de53c") -> list:
+    """Return an ADS-B state at `pos`"""
+    return [icao, "CHX24", "D-HHBG", "0020", pos.lat, pos.lon, 1100, 0, track, 100]
+
+
+def test_circular_mean():
+    """Mean of tracks wraps around north"""
+    assert math.isclose(circular_mean([350.0, 10.0]) % 360.0 + 360.0, 360.0)
+    assert math.isclose(circular_mean([80.0, 100.0]), 90.0)
+    assert math.isclose(circular_mean([270.0]), 270.0)
+
+
+def test_smooth():
+    """Reported tracks are averaged over the last `window` snapshots"""
+
+    history = TrackHistory(window=2)
+    pos = LatLon(49.0, 8.0)
+
+    states, _ = AicraftState.from_states([state(pos, 355.0)])
+    assert history.update(states, 1000)[0].track == 355.0
+
+    states, _ = AicraftState.from_states([state(travel(pos, 1.0, 0.0), 5.0)])
+    assert math.isclose(history.update(states, 1180)[0].track % 360.0 + 360.0, 360.0)
+
+    # The same snapshot again replaces its entry
+    states, _ = AicraftState.from_states([state(travel(pos, 1.0, 0.0), 5.0)])
+    assert math.isclose(history.update(states, 1180)[0].track % 360.0 + 360.0, 360.0)
+    assert len(history.entries["3de53c"]) == 2
+
+
+def test_turn():
+    """Tracks differing by more than `tolerance`, as when turning, are not
+    averaged, so the aircraft is notified as soon as it heads for a POI"""
+
+    start = travel(BGU, 20.0, 270.0)
+    history = TrackHistory(window=2)
+
+    states, _ = AicraftState.from_states([state(travel(start, 5.0, 180.0), 0.0)])
+    assert history.update(states, 1000)[0].track == 0.0
+
+    # Turned towards BGU
+    states, _ = AicraftState.from_states([state(start, 90.0)])
+    assert history.update(states, 1180)[0].track == 90.0
+
+    history = TrackHistory(window=2)
+    assert not notify.get_notifications(
+        [state(travel(start, 5.0, 180.0), 0.0)],
+        USER_SETTINGS,
+        now=1000,
+        history=history,
+    )
+    assert notify.get_notifications(
+        [state(start, 90.0)], USER_SETTINGS, now=1180, history=history
+    )
+
+
+def test_derive():
+    """Missing tracks are derived from the last position far enough away"""
+
+    history = TrackHistory(min_move=0.1)
+    pos = LatLon(49.0, 8.0)
+
+    states, rejected = AicraftState.from_states([state(pos, None)], False)
+    assert rejected == 0
+    # Nothing to derive a track from yet
+    assert not history.update(states, 1000)
+
+    # Hovering: Still nothing to derive from
+    states, _ = AicraftState.from_states([state(travel(pos, 0.05, 90.0), None)], False)
+    assert not history.update(states, 1060)
+
+    states, _ = AicraftState.from_states([state(travel(pos, 2.0, 45.0), None)], False)
+    derived = history.update(states, 1120)
+
+    # Bearing from the latest position far enough away
+    assert len(derived) == 1
+    assert math.isclose(
+        derived[0].track,
+        calc_bearing(travel(pos, 0.05, 90.0), travel(pos, 2.0, 45.0)),
+    )
+
+
+def test_evict_save_load(tmp_path):
+    """Old entries are dropped, history survives save and load"""
+
+    history = TrackHistory(max_age=300)
+    pos = LatLon(49.0, 8.0)
+
+    states, _ = AicraftState.from_states([state(pos, 10.0, "a"), state(pos, 20.0, "b")])
+    history.update(states, 1000)
+    states, _ = AicraftState.from_states([state(pos, 30.0, "b")])
+    history.update(states, 1200)
+
+    history.save(tmp_path / "tracks.json")
+    loaded = TrackHistory.load(tmp_path / "tracks.json", max_age=300)
+
+    assert loaded.entries == history.entries
+
+    loaded.evict(1400)
+    assert list(loaded.entries) == ["b"]
+    assert len(loaded.entries["b"]) == 1
+
+    assert not TrackHistory.load(tmp_path / "missing.json")
+
+
+def test_notify_history():
+    """With a history, aircraft without track are notified once derivable"""
+
+    start = travel(BGU, 10.0, 270.0)
+    history = TrackHistory()
+
+    assert not notify.get_notifications(
+        [state(start, None)], USER_SETTINGS, now=1000, history=history
+    )
+    assert not notify.get_notifications([state(start, None)], USER_SETTINGS)
+
+    notifications = notify.get_notifications(
+        [state(travel(start, 2.0, 90.0), None)],
+        USER_SETTINGS,
+        now=1060,
+        history=history,
+    )
+
+    assert len(notifications) == 1
@@ -0,0 +1,165 @@
+"""Test daemon mode watching for new snapshot files"""
+
+import argparse
+import json
+import os
+import threading
+import time
+import pytest
+import notify
+from pois import TOPIC_PREFIX, PoiTable
+from watcher import SnapshotWatcher, write_heartbeat
+from tests.test_notify import BGU, USER_SETTINGS
+
+
+def test_watcher_new_files(tmp_path):
+    """Only files created after start are reported, once completely written"""
+
+    (tmp_path / "2025-07-01").mkdir()
+    (tmp_path / "2025-07-01" / "2025-07-01_12-00.json").write_text("{}")
+
+    watcher = SnapshotWatcher(tmp_path)
+
+    assert not watcher.poll()
+
+    (tmp_path / "2025-07-02").mkdir()
+    snapshot = tmp_path / "2025-07-02" / "2025-07-02_12-03.json"
+    snapshot.write_text("{")
+
+    # Size seen first time
+    assert not watcher.poll()
+
+    with open(snapshot, "a", encoding="utf-8") as file:
+        file.write("}")
+
+    # Size changed
+    assert not watcher.poll()
+    # Size stable
+    assert watcher.poll() == [snapshot]
+    # Reported only once
+    assert not watcher.poll()
+
+
+def test_watcher_newest_days(tmp_path):
+    """Only the newest days are listed, and only if they changed"""
+
+    days = [tmp_path / f"2025-07-{day:02}" for day in range(1, 6)]
+
+    for day in days:
+        day.mkdir()
+        (day / f"{day.name}_12-00.json").write_text("{}")
+
+    watcher = SnapshotWatcher(tmp_path)
+
+    assert set(watcher.seen) == set(days[-2:])
+
+    # Files in older days are ignored
+    (days[0] / "2025-07-01_12-03.json").write_text("{}")
+    days.append(tmp_path / "2025-07-06")
+    days[-1].mkdir()
+    snapshot = days[-1] / "2025-07-06_00-00.json"
+    snapshot.write_text("{}")
+
+    assert not watcher.poll()
+    assert watcher.poll() == [snapshot]
+    # Days passed are forgotten
+    assert set(watcher.seen) == set(days[-2:])
+    assert watcher.seen[days[-1]] == {snapshot.name}
+
+    # Unchanged, not too recently modified directories are not listed
+    for day in days[-2:]:
+        os.utime(day, (time.time() - 60.0, time.time() - 60.0))
+
+    assert not watcher.poll()
+    assert not any(watcher.changed(day) for day in days[-2:])
+
+    (days[-1] / "2025-07-06_00-03.json").write_text("{}")
+
+    assert watcher.changed(days[-1])
+
+
+def test_heartbeat(tmp_path):
+    """Heartbeat file contains status"""
+
+    filename = tmp_path / "heartbeat"
+    write_heartbeat(filename, processed=42)
+
+    with open(filename, "r", encoding="utf-8") as file:
+        status = json.load(file)
+
+    assert status["processed"] == 42
+    assert "time" in status
+
+
+@pytest.mark.parametrize("topics", [False, True])
+def test_watch(tmp_path, capsys, topics):
+    """Daemon mode prints notifications for new files and stops on request.
+    Settings passed, with topics confirmed, are used until reloaded."""
+
+    users = tmp_path / "users.json"
+    users.write_text(json.dumps(USER_SETTINGS))
+    hems = tmp_path / "hems"
+    (hems / "2025-07-01").mkdir(parents=True)
+
+    args = argparse.Namespace(
+        stdout=True,
+        dry_run=False,
+        adsb=False,
+        no_notify=False,
+        archive=None,
+        hems_db=None,
+        metrics=tmp_path / "hems_lookout.prom",
+        topics=topics,
+        watch=hems,
+        interval=0.01,
+        heartbeat=tmp_path / "heartbeat",
+    )
+
+    settings = PoiTable(USER_SETTINGS, notify.MAX_DISTANCE, topics)
+    settings.confirm(settings.subscriptions())
+    recipient = TOPIC_PREFIX + settings.topics[0] if topics else "fcm_token"
+
+    notify.METRICS.reset()
+    stop = threading.Event()
+    daemon = threading.Thread(
+        target=notify.watch,
+        args=(args, users, stop),
+        kwargs={"settings": settings},
+    )
+    daemon.start()
+
+    try:
+        # Wait for the first poll, files existing before are ignored
+        while daemon.is_alive() and not (tmp_path / "heartbeat").exists():
+            time.sleep(0.01)
+
+        (hems / "2025-07-01" / "2025-07-01_12-00.json").write_text(
+            json.dumps(
+                {
+                    "states": [
+                        ["3de53c", "CHX24", "D-HHBG", "0020"]
+                        + [BGU.lat - 0.1, BGU.lon, 1100, 0, 0, 100]
+                    ]
+                }
+            )
+        )
+
+        for _ in range(500):
+            output = capsys.readouterr().out
+
+            if "CHX24" in output:
+                assert f"*** {recipient} ***" in output
+                break
+            time.sleep(0.01)
+        else:
+            assert False, "No notification"
+    finally:
+        stop.set()
+        daemon.join()
+
+    with open(tmp_path / "heartbeat", "r", encoding="utf-8") as file:
+        assert json.load(file)["processed"] == 1
+
+    assert (
+        "hems_lookout_files_total 1\n" in (tmp_path / "hems_lookout.prom").read_text()
+    )
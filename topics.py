@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+"""Per-POI FCM topics, so a POI watched by many recipients is notified by a
+single topic message. Subscriptions made are recorded, so only changes of
+the user settings need to be synced through the admin API."""
+
+import logging
+import sqlite3
+from pathlib import Path
+from typing import Callable, Optional
+
+TOPIC_BATCH_SIZE = 1000  # tokens per (un)subscribe request, as limited by FCM
+
+
+class TopicStore:
+    """SQLite table of (topic, recipient) subscriptions made"""
+
+    def __init__(self, filename: Path):
+        self.db = sqlite3.connect(filename)
+
+        with self.db:
+            self.db.execute(
+                """CREATE TABLE IF NOT EXISTS subscriptions (
+                    topic TEXT NOT NULL,
+                    recipient TEXT NOT NULL,
+                    PRIMARY KEY (topic, recipient)
+                ) WITHOUT ROWID"""
+            )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self) -> None:
+        """Close database"""
+        self.db.close()
+
+    def subscriptions(self) -> dict[str, set[str]]:
+        """Return the recipients subscribed to each topic"""
+        subscriptions = {}
+
+        for topic, recipient in self.db.execute("SELECT * FROM subscriptions"):
+            subscriptions.setdefault(topic, set()).add(recipient)
+
+        return subscriptions
+
+    def add(self, topic: str, recipients: list[str]) -> None:
+        """Record `recipients` being subscribed to `topic`"""
+        with self.db:
+            self.db.executemany(
+                "INSERT OR IGNORE INTO subscriptions VALUES (?, ?)",
+                [(topic, recipient) for recipient in recipients],
+            )
+
+    def remove(self, topic: str, recipients: list[str]) -> None:
+        """Record `recipients` being unsubscribed from `topic`"""
+        with self.db:
+            self.db.executemany(
+                "DELETE FROM subscriptions WHERE topic = ? AND recipient = ?",
+                [(topic, recipient) for recipient in recipients],
+            )
+
+
+def manage(function: Callable, tokens: list[str], topic: str) -> Optional[list[str]]:
+    """(Un)subscribe `tokens` by `function`, `messaging.subscribe_to_topic` or
+    `messaging.unsubscribe_from_topic`. Return the tokens succeeded, None if
+    the whole request failed."""
+    try:
+        response = function(tokens, topic)
+
+    # pylint: disable=broad-exception-caught
+    except Exception as ex:
+        logging.error("Topic '%s': %s", topic, ex)
+        return None
+
+    for error in response.errors:
+        logging.warning(
+            "Topic '%s': '%s': %s", topic, tokens[error.index], error.reason
+        )
+
+    failed = {error.index for error in response.errors}
+
+    return [token for n, token in enumerate(tokens) if n not in failed]
+
+
+def sync(store: TopicStore, desired: dict[str, set[str]], messaging) -> tuple[int, int]:
+    """Subscribe and unsubscribe recipients, as far as `desired` differs from
+    the subscriptions recorded in `store`, through `messaging`, i.e.
+    `firebase_admin.messaging`. Failed subscriptions are retried next time.
+    Unsubscribing only fails per token for tokens no longer valid, which are
+    not subscribed to anything, anyway.
+    Return the number of subscriptions added and removed."""
+    current = store.subscriptions()
+    added = removed = 0
+
+    for topic in sorted(current.keys() | desired.keys()):
+        subscribe = sorted(desired.get(topic, set()) - current.get(topic, set()))
+        unsubscribe = sorted(current.get(topic, set()) - desired.get(topic, set()))
+
+        for start in range(0, len(subscribe), TOPIC_BATCH_SIZE):
+            tokens = subscribe[start : start + TOPIC_BATCH_SIZE]
+            succeeded = manage(messaging.subscribe_to_topic, tokens, topic) or []
+            store.add(topic, succeeded)
+            added += len(succeeded)
+
+        for start in range(0, len(unsubscribe), TOPIC_BATCH_SIZE):
+            tokens = unsubscribe[start : start + TOPIC_BATCH_SIZE]
+
+            if manage(messaging.unsubscribe_from_topic, tokens, topic) is not None:
+                store.remove(topic, tokens)
+                removed += len(tokens)
+
+    return added, removed
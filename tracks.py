@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+"""Recent positions per aircraft across snapshots, to smooth noisy tracks
+and to derive tracks from successive positions, where none is reported"""
+
+import json
+import math
+import os
+import time
+from collections import deque
+from pathlib import Path
+from typing import Optional
+from gcmath import LatLon, calc_bearing, calc_distance
+
+
+def circular_mean(angles: list[float]) -> float:
+    """Return the mean of `angles` in degrees, wrapping around 0°"""
+    x = sum(math.cos(math.radians(a)) for a in angles)
+    y = sum(math.sin(math.radians(a)) for a in angles)
+
+    return math.degrees(math.atan2(y, x)) % 360.0
+
+
+class TrackHistory:
+    """Ring buffer of the last `size` (time, lat, lon, track) entries per
+    aircraft, keyed by ICAO hex code, else callsign or registration.
+
+    Entries older than `max_age` seconds are dropped, as tracks change too
+    much in between. A reported track is replaced by the circular mean of
+    those of the last `window` reported tracks within `tolerance` degrees of
+    it, so noise is smoothed, but turns are not delayed. A missing track is
+    derived from the
+    bearing between the last position at least `min_move` km away and the
+    current one.
+    """
+
+    # pylint: disable=too-many-arguments,too-many-positional-arguments
+
+    def __init__(
+        self,
+        size: int = 8,
+        max_age: float = 400.0,
+        window: int = 2,
+        min_move: float = 0.1,
+        entries: Optional[dict] = None,
+        tolerance: float = 10.0,
+    ):
+        self.size = size
+        self.max_age = max_age
+        self.window = window
+        self.min_move = min_move
+        self.tolerance = tolerance
+        self.entries = {
+            key: deque((tuple(entry) for entry in values), maxlen=size)
+            for key, values in (entries or {}).items()
+        }
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def evict(self, now: float) -> None:
+        """Drop entries older than `max_age`, and aircraft without any"""
+        for key in list(self.entries):
+            entries = self.entries[key]
+
+            while entries and now - entries[0][0] > self.max_age:
+                entries.popleft()
+
+            if not entries:
+                del self.entries[key]
+
+    def update(self, states: list, now: Optional[float] = None) -> list:
+        """Record `states` (`AicraftState`s) taken at `now`, replacing their
+        tracks by smoothed or derived ones. Return states having a track."""
+        now = time.time() if now is None else now
+
+        self.evict(now)
+
+        for state in states:
+            key = state.icao or state.callsign or state.reg
+            entries = self.entries.setdefault(key, deque(maxlen=self.size))
+
+            # The same snapshot processed again replaces its entry
+            while entries and entries[-1][0] >= now:
+                entries.pop()
+
+            derived = None
+
+            for _, lat, lon, _ in reversed(entries):
+                prev = LatLon(lat, lon)
+
+                if calc_distance(prev, state.pos) >= self.min_move:
+                    derived = calc_bearing(prev, state.pos)
+                    break
+
+            entries.append((now, state.pos.lat, state.pos.lon, state.track))
+
+            if state.track is None:
+                state.track = derived
+            else:
+                state.track = circular_mean(
+                    [
+                        e[3]
+                        for e in list(entries)[-self.window :]
+                        if e[3] is not None
+                        and abs((e[3] - state.track + 180.0) % 360.0 - 180.0)
+                        <= self.tolerance
+                    ]
+                )
+
+        return [state for state in states if state.track is not None]
+
+    @classmethod
+    def load(cls, filename: Path, **kwargs) -> "TrackHistory":
+        """Load history saved by `save()`, or start an empty one"""
+        try:
+            with open(filename, "r", encoding="utf-8") as file:
+                return cls(entries=json.load(file), **kwargs)
+        except FileNotFoundError:
+            return cls(**kwargs)
+
+    def save(self, filename: Path) -> None:
+        """Atomically replace `filename` with the history as JSON"""
+        tmp = Path(f"{filename}.tmp")
+
+        with open(tmp, "w", encoding="utf-8") as file:
+            json.dump({key: list(values) for key, values in self.entries.items()}, file)
+
+        os.replace(tmp, filename)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+
+"""Watch a directory tree for new snapshot files, as written by query-adsb.sh"""
+
+import json
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+
+MTIME_GRANULARITY = 2_000_000_000  # ns, coarser than any file system's
+
+
+class SnapshotWatcher:
+    """Poll `root` for new files matching `pattern` in its newest `days`
+    subdirectories by name, by default any `data/hems/<date>/*.json` of
+    today and yesterday, so the tree may grow without slowing polls down.
+    Files present upon start are considered processed already. Files are
+    only reported once their size did not change between two polls, so they
+    are not picked up half-written. Directories are only listed if their
+    modification time changed, is too recent to be trusted, or files in
+    them are pending.
+    """
+
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, root: Path, pattern: str = "*.json", days: int = 2):
+        self.root = Path(root)
+        self.pattern = pattern
+        self.days = days
+        self.seen = {}
+        self.mtimes = {}
+        self.pending = {}
+
+        for directory in self.directories():
+            self.mtimes[directory] = directory.stat().st_mtime_ns
+            self.seen[directory] = {path.name for path in directory.glob(pattern)}
+
+    def directories(self) -> list[Path]:
+        """Return the newest `days` subdirectories of `root`, by name"""
+        try:
+            with os.scandir(self.root) as entries:
+                names = sorted(entry.name for entry in entries if entry.is_dir())
+        except FileNotFoundError:
+            return []
+
+        return [self.root / name for name in names[-self.days :]]
+
+    def changed(self, directory: Path) -> bool:
+        """Return whether `directory` needs to be listed"""
+        try:
+            mtime = directory.stat().st_mtime_ns
+        except FileNotFoundError:
+            return False
+
+        # Files created within the timestamp granularity might not change it
+        if (
+            self.mtimes.get(directory) == mtime
+            and time.time_ns() - mtime > MTIME_GRANULARITY
+            and not any(path.parent == directory for path in self.pending)
+        ):
+            return False
+
+        self.mtimes[directory] = mtime
+
+        return True
+
+    def poll(self) -> list[Path]:
+        """Return new, completely written files in order of their names"""
+        ready = []
+        directories = self.directories()
+
+        # Forget days passed
+        for directory in set(self.seen) - set(directories):
+            del self.seen[directory]
+
+        self.mtimes = {d: m for d, m in self.mtimes.items() if d in directories}
+        self.pending = {
+            p: s for p, s in self.pending.items() if p.parent in directories
+        }
+
+        for directory in filter(self.changed, directories):
+            seen = self.seen.setdefault(directory, set())
+
+            for path in directory.glob(self.pattern):
+                if path.name in seen:
+                    continue
+
+                try:
+                    size = path.stat().st_size
+                except FileNotFoundError:
+                    continue
+
+                if size and self.pending.get(path) == size:
+                    del self.pending[path]
+                    seen.add(path.name)
+                    ready.append(path)
+                else:
+                    self.pending[path] = size
+
+        return sorted(ready)
+
+
+def write_heartbeat(filename: Path, **status) -> None:
+    """Atomically replace `filename` with the current time and `status` as JSON"""
+    tmp = Path(f"{filename}.tmp")
+
+    with open(tmp, "w", encoding="utf-8") as file:
+        json.dump(
+            {
+                "time": datetime.now().isoformat(timespec="seconds"),
+                "pid": os.getpid(),
+                **status,
+            },
+            file,
+        )
+
+    os.replace(tmp, filename)